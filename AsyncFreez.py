@@ -0,0 +1,357 @@
+import time
+import asyncio
+import subprocess
+from typing import List, Dict, Tuple
+from argparse import Namespace
+
+from Freez import (
+    Freez,
+    Ufreez,
+    WinManager,
+    WindowWatcher,
+    GdbusBackend,
+    DBusBackend,
+)
+from Trace import tracer
+from config import (
+    BACKEND,
+    DBUS_ADDRESS,
+    CLOSE_WAIT,
+    SNAPSHOT_MAX_AGE,
+)
+
+
+async def fill_pids(win_man: "AsyncWinManager", windows: List[Dict]) -> None:
+    # the sync code falls back to a blocking Details call when List has no pid
+    missing = [win for win in windows if win.get("pid") is None]
+    details = await asyncio.gather(*(win_man.get_details(win["id"]) for win in missing))
+    for win, win_details in zip(missing, details):
+        win["pid"] = win_details.get("pid")
+
+
+async def open_win_manager(backend=None) -> "AsyncWinManager":
+    # the D-Bus backend when possible, the gdbus CLI otherwise
+    if backend is None and BACKEND == "dbus":
+        try:
+            backend = await AsyncDBusBackend.open(DBUS_ADDRESS)
+        except Exception:
+            pass
+    return AsyncWinManager(backend or AsyncGdbusBackend())
+
+
+class AsyncWinManager(WinManager):
+    # same methods as WinManager, awaitable and safe to run concurrently on one loop
+
+    def __init__(self, backend):
+        super().__init__(backend)
+
+    async def _call(self, method: str, params: List = []) -> str:
+        with tracer.span(method, "bus", win_id=params[0] if params else None):
+            return await self._backend.call(method, params)
+
+    async def get_windows(self, max_age: float = 0) -> List[Dict]:
+        cached = self._get_cached(max_age)
+        if cached is not None:
+            return cached
+        windows = self._text_to_iterable(await self._call("List"), "[", "]")
+        self._update(windows)
+        return windows
+
+    async def get_details(self, win_id: int) -> Dict:
+        return self._text_to_iterable(await self._call("Details", [win_id]), "{", "}")
+
+    async def wait_for_windows(self, since: int, deadline: float) -> Tuple[int, List[Dict]]:
+        # returns the generation and the windows added after generation since, [] once deadline passes
+        if self._watcher is None:
+            self._watcher = AsyncWindowWatcher(self, await self._backend.watch())
+        return await self._watcher.wait(since, deadline)
+
+    async def list(self, pretty: bool = True) -> None:
+        windows = await self.get_windows()
+        if not pretty:
+            print(windows)
+        else:
+            for win in windows:
+                for key, value in win.items():
+                    print(f"{key}: {value}")
+                print()
+
+    async def details(self, win_id: int, pretty: bool = True) -> None:
+        details = await self.get_details(win_id)
+        if not pretty:
+            print(details)
+        else:
+            for key, value in details.items():
+                print(f"{key}: {value}")
+            print()
+
+    async def minimize(self, win_id: int) -> None:
+        await self._call("Minimize", [win_id])
+
+    async def unminimize(self, win_id: int) -> None:
+        await self._call("Unminimize", [win_id])
+
+    async def maximize(self, win_id: int) -> None:
+        await self._call("Maximize", [win_id])
+
+    async def unmaximize(self, win_id: int) -> None:
+        await self._call("Unmaximize", [win_id])
+
+    async def move(self, win_id: int, x: int, y: int) -> None:
+        await self._call("Move", [win_id, x, y])
+
+    async def resize(self, win_id: int, width: int, height: int) -> None:
+        await self._call("Resize", [win_id, width, height])
+
+    async def move_resize(self, win_id: int, x: int, y: int, width: int, height: int) -> None:
+        await self._call("MoveResize", [win_id, x, y, width, height])
+
+    async def move_to_workspace(self, win_id: int, workspace_id: int) -> None:
+        await self._call("MoveToWorkspace", [win_id, workspace_id])
+
+    async def activate(self, win_id: int) -> None:
+        await self._call("Activate", [win_id])
+
+    async def close(self, win_id: int) -> None:
+        await self._call("Close", [win_id])
+
+    async def aclose(self) -> None:
+        await self._backend.close()
+
+
+class AsyncWindowWatcher(WindowWatcher):
+
+    async def wait(self, since: int, deadline: float) -> Tuple[int, List[Dict]]:
+        steps = self._steps(since, deadline)
+        result = None
+        while True:
+            try:
+                step = steps.send(result)
+            except StopIteration as stop:
+                return stop.value
+            if step is None:
+                result = await self._win_man.get_windows()
+            else:
+                result = await self._sleep(step)
+
+    async def _sleep(self, timeout: float) -> bool:
+        if self._signals is None:
+            await asyncio.sleep(timeout)
+            return False
+        try:
+            await asyncio.wait_for(self._signals.get(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        while not self._signals.empty():
+            self._signals.get_nowait()
+        return True
+
+
+class AsyncGdbusBackend(GdbusBackend):
+
+    async def call(self, method: str, params: List = []) -> str:
+        cmd = self._builder.build(method, self._get_params(params))
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=subprocess.PIPE, **self._devnull
+        )
+        stdout, _ = await proc.communicate()
+        return stdout.decode("utf-8")
+
+    async def watch(self):
+        return None
+
+    async def close(self) -> None:
+        pass
+
+
+class AsyncDBusBackend(DBusBackend):
+    # requests are pipelined, many calls can wait for their replies at once
+
+    def __init__(self, conn, router, bus_name: str = None):
+        from jeepney import DBusAddress
+
+        self._conn = conn
+        self._router = router
+        self._address = DBusAddress(
+            self._object_path,
+            bus_name=bus_name or self._bus_name,
+            interface=self._interface,
+        )
+
+    @classmethod
+    async def open(cls, address: str = None, bus_name: str = None) -> "AsyncDBusBackend":
+        from jeepney.io.asyncio import DBusRouter, open_dbus_connection
+
+        conn = await open_dbus_connection(address or "SESSION")
+        router = DBusRouter(conn)
+        await router.__aenter__()
+        return cls(conn, router, bus_name)
+
+    async def call(self, method: str, params: List = []) -> str:
+        msg = self._build_call(method, params)
+        reply = await asyncio.wait_for(
+            self._router.send_and_get_reply(msg), self._timeout
+        )
+        return self._unwrap(reply)
+
+    async def watch(self) -> asyncio.Queue:
+        from jeepney.bus_messages import message_bus
+
+        rule = self._get_signal_rule()
+        await self._router.send_and_get_reply(message_bus.AddMatch(rule))
+        self._signals = self._router.filter(rule, queue=asyncio.Queue())
+        return self._signals.queue
+
+    async def close(self) -> None:
+        await self._router.__aexit__(None, None, None)
+        await self._conn.close()
+
+
+class AsyncThreadBackend:
+    # runs any blocking backend in worker threads
+
+    def __init__(self, backend):
+        self._backend = backend
+
+    async def call(self, method: str, params: List = []) -> str:
+        return await asyncio.to_thread(self._backend.call, method, params)
+
+    async def watch(self):
+        return None
+
+    async def close(self) -> None:
+        pass
+
+
+class AsyncFreez(Freez):
+    # Freez.run as a coroutine, the details of all windows are requested at once
+
+    def __init__(self, win_man: AsyncWinManager):
+        super().__init__()
+        self.win_man = win_man
+
+    async def run(self, args: Namespace) -> None:
+        if self._list(args.list):
+            return
+        if self._delete(args.delete):
+            return
+        if self._prune(args.prune):
+            return
+        if args.manage or args.autosave:
+            raise ValueError("-m and -a are not available in the async runner")
+
+        windows = await self.win_man.get_windows()
+        if args.name:
+            workspace = await self._get_workspace(args.name, windows)
+            self._save(args.name, workspace)
+
+        if args.close or args.reboot or args.shutdown:
+            await self._close_all(windows, args.close)
+            if args.close:
+                return
+        if self._reboot(args.reboot):
+            return
+        if self._shutdown(args.shutdown):
+            return
+
+    async def _close_all(self, windows: List[Dict], close_own: bool) -> None:
+        await fill_pids(self.win_man, windows)
+        own, others = self._split_own(windows)
+        procs = self._get_procs(others)
+        await asyncio.gather(*(self.win_man.close(win["id"]) for win in others))
+        alive = await asyncio.to_thread(self._wait_closed, procs, CLOSE_WAIT)
+        self._report_alive(alive, others)
+        if close_own:
+            await asyncio.gather(*(self.win_man.close(win["id"]) for win in own))
+
+    async def _get_workspace(self, workspace_name: str, windows: List) -> Dict:
+        details = await asyncio.gather(
+            *(self.win_man.get_details(win["id"]) for win in windows)
+        )
+        workspace = {workspace_name: dict()}
+        for idx, (win, win_details) in enumerate(zip(windows, details)):
+            workspace[workspace_name][f"win{idx}"] = self._make_win_config(win, win_details)
+        return workspace
+
+
+class AsyncUfreez(Ufreez):
+    # Ufreez.run as a coroutine, the same restore steps with waits and placements on one loop
+
+    def __init__(self, win_man: AsyncWinManager):
+        super().__init__()
+        self.win_man = win_man
+        # placements in flight, a placement starts as soon as its window is matched
+        self._tasks: List[asyncio.Task] = []
+
+    async def run(self, args: Namespace) -> None:
+        if self._list(args.list):
+            return
+        if self._delete(args.delete):
+            return
+        if self._history(args.history):
+            return
+        await self._drive(self._run_steps(args))
+
+    async def _drive(self, steps):
+        result, error = None, None
+        while True:
+            try:
+                step = steps.throw(error) if error else steps.send(result)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                result, error = await getattr(self, f"_step_{step[0]}")(*step[1:]), None
+            except Exception as e:
+                error = e
+
+    async def _place(
+        self, win_id: int, position: tuple, size: tuple, maximized: bool, unmaximize: bool = False
+    ) -> None:
+        if win_id:
+            if unmaximize:
+                await self.win_man.unmaximize(win_id)
+            await self.win_man.move_resize(win_id, *position, *size)
+            if maximized:
+                await self.win_man.maximize(win_id)
+            self._placed[win_id] = (position, size, maximized, time.time())
+            if self.first_window is None:
+                self.first_window = time.perf_counter()
+
+    async def _get_geometry(self, win_id: int) -> Dict:
+        try:
+            return await self.win_man.get_details(win_id)
+        except (ValueError, KeyError):
+            return None
+
+    async def _step_windows(self, max_age: float) -> List[Dict]:
+        return await self.win_man.get_windows(max_age)
+
+    async def _step_keys(self, windows: List[Dict]) -> List[Tuple[str, str]]:
+        await fill_pids(self.win_man, windows)
+        return [self._get_win_key(win) for win in windows]
+
+    async def _step_details(self, win_ids: List[int]) -> List[Dict]:
+        return await asyncio.gather(*(self._get_geometry(win_id) for win_id in win_ids))
+
+    async def _step_wait(self, since: int, deadline: float) -> Tuple[int, List[Dict]]:
+        # with the pids filled in the matcher makes no blocking Details calls
+        since, new_windows = await self.win_man.wait_for_windows(since, deadline)
+        await fill_pids(self.win_man, new_windows)
+        return since, new_windows
+
+    async def _step_place(self, *placement) -> None:
+        # the task copies the trace context of the window it places
+        self._tasks.append(asyncio.create_task(self._place(*placement)))
+
+    async def _step_join(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        await asyncio.gather(*tasks)
+
+    async def _step_sleep(self, seconds: float) -> None:
+        await asyncio.sleep(seconds)
+
+    async def _step_idle(self) -> None:
+        await asyncio.to_thread(self._wait_idle)
+
+    async def _step_close(self, win_id: int) -> None:
+        await self.win_man.close(win_id)
@@ -0,0 +1,106 @@
+import os
+import io
+import json
+import socket
+import threading
+import socketserver
+from typing import Dict
+from argparse import Namespace
+from contextlib import redirect_stdout
+
+from config import SOCKET_PATH, DAEMON_REFRESH
+
+
+def run_in_daemon(prog: str, args: Namespace) -> bool:
+    # returns False when no daemon is listening, the caller then runs the command itself
+    # once connected the daemon may already be running the command, so errors are only reported
+    if not os.path.exists(SOCKET_PATH):
+        return False
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(SOCKET_PATH)
+        except OSError:
+            return False
+        try:
+            request = {"prog": prog, "args": vars(args)}
+            sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            with sock.makefile("rb") as f:
+                response = json.loads(f.readline())
+        except (OSError, ValueError) as e:
+            print(f"freezd: no response ({e})")
+            return True
+    print(response["output"], end="")
+    return True
+
+
+class FreezDaemon(socketserver.UnixStreamServer):
+    # holds the bus connection, the store and the resolved processes between commands
+
+    def __init__(self, path: str = SOCKET_PATH):
+        from Freez import WinManager, ExecParser
+        from Store import WorkspaceStore
+
+        self.win_man = WinManager()
+        self.exec_parser = ExecParser()
+        self.store = WorkspaceStore()
+
+        self._path = path
+        if os.path.exists(path):
+            os.remove(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        super().__init__(path, FreezHandler)
+        os.chmod(path, 0o600)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher = threading.Thread(target=self._refresh, daemon=True)
+        self._refresher.start()
+
+    def execute(self, prog: str, args: Dict) -> str:
+        from Freez import Freez, Ufreez
+
+        # commands run one at a time, stdout is captured for the client
+        with self._lock:
+            runner = Freez() if prog == "freez" else Ufreez()
+            runner.win_man = self.win_man
+            runner._exec_parser = self.exec_parser
+            runner._store = self.store
+            output = io.StringIO()
+            with redirect_stdout(output):
+                try:
+                    runner.run(Namespace(**args))
+                except Exception as e:
+                    print(e)
+            return output.getvalue()
+
+    def _refresh(self) -> None:
+        # follows the window list and resolves the executables of new windows ahead of a save
+        since = 0
+        while not self._stop.wait(DAEMON_REFRESH):
+            try:
+                windows = self.win_man.get_windows()
+            except Exception:
+                continue
+            since, added, removed = self.win_man.changes(since)
+            if not added and not removed:
+                continue
+            for win in added:
+                if win.get("pid"):
+                    self.exec_parser.get_proc(win["pid"])
+            self.exec_parser.retain(win["pid"] for win in windows if win.get("pid"))
+
+    def server_close(self) -> None:
+        self._stop.set()
+        super().server_close()
+        if os.path.exists(self._path):
+            os.remove(self._path)
+
+
+class FreezHandler(socketserver.StreamRequestHandler):
+
+    def handle(self) -> None:
+        try:
+            request = json.loads(self.rfile.readline())
+            output = self.server.execute(request["prog"], request["args"])
+        except (ValueError, KeyError) as e:
+            output = f"Invalid request: {e}\n"
+        self.wfile.write(json.dumps({"output": output}).encode("utf-8") + b"\n")
@@ -1,20 +1,45 @@
 import subprocess
 import os
-import sys
-from typing import List, Dict, Iterable, Callable
+from typing import List, Dict, Iterable, Callable, Tuple
 import json
+import shlex
 from argparse import Namespace
 from abc import ABC, abstractmethod
-import curses
 import time
+import threading
+from queue import Queue, Empty
+from functools import cached_property
 
+from Store import WorkspaceStore, LaunchStats
+from Trace import tracer
 from config import (
-    DATA_DIR,
-    DATA_FILE,
     OVERWRITE,
     TIMEOUT,
     CLOSE_TERMINAL,
     NEW_TERM_IN_TAB,
+    BACKEND,
+    DBUS_ADDRESS,
+    WORKERS,
+    PARALLEL_RESTORE,
+    POLL_MIN,
+    POLL_MAX,
+    RECONCILE,
+    AUTOSAVE_INTERVAL,
+    AUTOSAVE_FULL_EVERY,
+    PRIORITIES,
+    DEFAULT_PRIORITY,
+    IDLE_CPU,
+    IDLE_TIMEOUT,
+    MAX_LAUNCHES,
+    LAUNCH_TICK,
+    SETTLE_CPU,
+    SETTLE_MIN_AGE,
+    CLOSE_WAIT,
+    SNAPSHOT_MAX_AGE,
+    GEOMETRY_PASSES,
+    GEOMETRY_DELAY,
+    GEOMETRY_TOLERANCE,
+    COALESCE,
 )
 
 
@@ -28,70 +53,68 @@ class FreezABC(ABC):
 
     def __init__(self):
         super().__init__()
-        self.win_man: WinManager = WinManager()
-        self._data_dir = DATA_DIR
-        self._data_file = os.path.join(self._data_dir, DATA_FILE)
+        self._store: WorkspaceStore = WorkspaceStore()
 
-    def _check_dir(self):
-        if not os.path.exists(self._data_dir):
-            os.makedirs(self._data_dir)
+    @cached_property
+    def win_man(self) -> "WinManager":
+        # created on first use, -l and -d never need the bus
+        return WinManager()
 
-    def _save_data(self, data: Dict) -> None:
-        try:
-            with open(self._data_file, "w") as f:
-                json.dump(data, f)
-        except Exception as e:
-            print(e)
+    @cached_property
+    def _exec_parser(self) -> "ExecParser":
+        return ExecParser()
 
-    def _load_data(self) -> Dict:
-        try:
-            if not os.path.exists(self._data_file):
-                return {}
-            with open(self._data_file, "r") as f:
-                data = json.load(f)
-            return data
-        except json.JSONDecodeError as e:
-            return {}
-        except Exception as e:
-            print(e)
-            return {}
-
-    def _list(self, data: Dict, _list: bool) -> bool:
+    def _list(self, _list: bool) -> bool:
         if _list:
-            if data:
-                for name in data:
+            names = self._store.names()
+            if names:
+                for name in names:
                     print(name)
             else:
                 print("No saved workspaces")
             return True
         return False
 
-    def _delete(self, data: Dict, names: List[str]) -> bool:
+    def _delete(self, names: List[str]) -> bool:
         if names:
-            for name in names:
-                if name in data.keys():
-                    del data[name]
-            self._save_data(data)
+            self._store.delete(names)
             return True
         return False
 
-    @abstractmethod
     def run(self, args: Namespace) -> None:
+        if args.trace:
+            tracer.enable()
+        with tracer.span(type(self).__name__, "run"):
+            self._run(args)
+        if args.trace:
+            tracer.dump(args.trace)
+            tracer.print_summary()
+
+    @abstractmethod
+    def _run(self, args: Namespace) -> None:
         pass
 
 
 class Freez(FreezABC):
 
-    def __init__(self):
-        super().__init__()
-        self._crs_man: CursesManager = CursesManager()
-        self._exec_parser: ExecParser = ExecParser()
+    @cached_property
+    def _crs_man(self) -> "CursesManager":
+        return CursesManager()
 
-    def run(self, args: Namespace) -> None:
-        data = self._load_data()
-        if self._list(data, args.list):
+    def _run(self, args: Namespace) -> None:
+        if self._list(args.list):
+            return
+        if self._delete(args.delete):
             return
-        if self._delete(data, args.delete):
+        if self._prune(args.prune):
+            return
+
+        if args.autosave:
+            # runs until Ctrl-C
+            try:
+                Autosaver(self, args.name, args.interval or AUTOSAVE_INTERVAL).run()
+            except KeyboardInterrupt:
+                pass
             return
 
         windows = self.win_man.get_windows()
@@ -99,10 +122,12 @@ class Freez(FreezABC):
             if args.manage:
                 windows = self._manage(windows)
             workspace = self._get_workspace(args.name, windows)
-            self._save(args.name, data, workspace)
+            self._save(args.name, workspace)
 
-        if self._close(windows, args.close):
-            return
+        # -r and -s close the windows too, but leave the terminal running freez open
+        if self._close(windows, args.close or args.reboot or args.shutdown, args.close):
+            if args.close:
+                return
 
         if self._reboot(args.reboot):
             return
@@ -110,49 +135,128 @@ class Freez(FreezABC):
         if self._shutdown(args.shutdown):
             return
 
+    def _prune(self, keep: int) -> bool:
+        if keep is not None:
+            self._store.prune(keep)
+            return True
+        return False
+
     def _get_workspace(self, workspace_name: str, windows: List) -> Dict:
-        workspace = {workspace_name: dict()}
-        cwd = os.getcwd()
-        for idx, win in enumerate(windows):
-            name = f"win{idx}"
-            win_config = dict()
+        from concurrent.futures import ThreadPoolExecutor
 
-            cls = win["wm_class"]
-            details = self.win_man.get_details(win["id"])
-            pid = details["pid"]
-            executable = self._exec_parser.get_exec(pid, cls, win["wm_class_instance"])
-            size = (details["width"], details["height"])
-            maximized = bool(int(details["maximized"]))
-            position = (details["x"], details["y"])
-            win_config["wm_class"] = cls
-            win_config["size"] = size
-            win_config["position"] = position
-            win_config["maximized"] = maximized
-            win_config["executable"] = executable
-            win_config["cwd"] = cwd
-            win_config["extra_cmd"] = ""
-            workspace[workspace_name][name] = win_config
+        workspace = {workspace_name: dict()}
+        # details and executables are looked up concurrently, map keeps the order
+        with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+            configs = executor.map(self._get_win_config, windows)
+            for idx, win_config in enumerate(configs):
+                name = f"win{idx}"
+                workspace[workspace_name][name] = win_config
 
         return workspace
 
-    def _save(self, name: str, data: Dict, workspace: Dict) -> None:
-        if not OVERWRITE:
+    def _get_win_config(self, win: Dict) -> Dict:
+        with tracer.context(wm_class=win["wm_class"]):
+            details = self.win_man.get_details(win["id"])
+            # kept for callers that follow the processes of the windows
+            win["pid"] = details.get("pid")
+            return self._make_win_config(win, details)
+
+    def _make_win_config(self, win: Dict, details: Dict) -> Dict:
+        win_config = dict()
+        cls = win["wm_class"]
+        pid = details["pid"]
+        with tracer.span("get_exec", "proc", wm_class=cls, pid=pid) as exec_args:
+            executable = self._exec_parser.get_exec(pid, cls, win["wm_class_instance"])
+            exec_args["executable"] = executable
+        size = (details["width"], details["height"])
+        maximized = bool(int(details["maximized"]))
+        position = (details["x"], details["y"])
+        win_config["wm_class"] = cls
+        win_config["wm_class_instance"] = win["wm_class_instance"]
+        win_config["size"] = size
+        win_config["position"] = position
+        win_config["maximized"] = maximized
+        win_config["executable"] = executable
+        win_config["cwd"] = self._exec_parser.get_cwd(pid) or os.getcwd()
+        win_config["extra_cmd"] = ""
+        win_config["priority"] = PRIORITIES.get(cls, DEFAULT_PRIORITY)
+        return win_config
+
+    def _save(self, name: str, workspace: Dict) -> None:
+        if not OVERWRITE and name in self._store:
             selected = [False]
             msg = f"'{name}' exists. Do you want to overwrite it?"
             self._crs_man.run(self._crs_man.confirm_menu, msg, selected)
             if not selected[0]:
                 return
 
-        data.update(workspace)
-        self._save_data(data)
+        self._store.save(name, workspace[name])
 
-    def _close(self, windows: List[Dict], _close: bool) -> None:
+    def _close(self, windows: List[Dict], _close: bool, close_own: bool = True) -> bool:
+        # all windows are closed at once, then their processes get CLOSE_WAIT seconds in total to exit
         if _close:
-            for win in windows:
-                self.win_man.close(win["id"])
+            own, others = self._split_own(windows)
+            procs = self._get_procs(others)
+            self._close_windows(others)
+            alive = self._wait_closed(procs, CLOSE_WAIT)
+            self._report_alive(alive, others)
+            # the terminal running freez goes last
+            if own and close_own:
+                self._close_windows(own)
             return True
         return False
 
+    def _close_windows(self, windows: List[Dict]) -> None:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+            list(executor.map(self.win_man.close, [win["id"] for win in windows]))
+
+    def _split_own(self, windows: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        # windows of the processes freez runs under, closing them first would end freez
+        import psutil
+
+        ancestors = {proc.pid for proc in psutil.Process().parents()}
+        own, others = [], []
+        for win in windows:
+            (own if self._get_pid(win) in ancestors else others).append(win)
+        return own, others
+
+    def _get_pid(self, win: Dict) -> int:
+        if "pid" not in win:
+            win["pid"] = self.win_man.get_details(win["id"]).get("pid")
+        return win["pid"]
+
+    def _get_procs(self, windows: List[Dict]) -> List:
+        import psutil
+
+        procs = {}
+        for win in windows:
+            pid = self._get_pid(win)
+            if pid and pid not in procs:
+                try:
+                    procs[pid] = psutil.Process(pid)
+                except psutil.Error:
+                    pass
+        return list(procs.values())
+
+    def _wait_closed(self, procs: List, timeout: float) -> List:
+        import psutil
+
+        with tracer.span("wait_closed", "proc", procs=len(procs)):
+            _, alive = psutil.wait_procs(procs, timeout=timeout)
+        return alive
+
+    def _report_alive(self, alive: List, windows: List[Dict]) -> None:
+        if not alive:
+            return
+        classes = {}
+        for win in windows:
+            classes.setdefault(win.get("pid"), win["wm_class"])
+        print(f"Still running after {CLOSE_WAIT} s:")
+        for proc in alive:
+            print(f"  {classes.get(proc.pid, '?')} (pid {proc.pid})")
+
     def _reboot(self, _reboot: bool) -> None:
         if _reboot:
             subprocess.run(["reboot"])
@@ -168,31 +272,173 @@ class Freez(FreezABC):
     def _manage(self, windows: List[Dict]) -> List:
         selected = [True] * len(windows)
         items = [win["title"] for win in windows]
-        self._crs_man.run(self._crs_man.menu_select, items, selected)
+        classes = [win["wm_class"] for win in windows]
+        self._crs_man.run(self._crs_man.menu_select, items, selected, classes)
         return [win for win, sel in zip(windows, selected) if sel]
 
 
+class Autosaver:
+    # snapshots the desktop periodically, asking only about windows that changed
+
+    def __init__(self, freez: Freez, name: str, interval: float):
+        self._freez = freez
+        self._name = name
+        self._interval = interval
+        self._fingerprints: Dict[int, Tuple] = {}
+        self._configs: Dict[int, Dict] = {}
+        self._pids: Dict[int, int] = {}
+        self._last: Dict = freez._store.load(name)
+        self._ticks = 0
+
+    def run(self) -> None:
+        while True:
+            self.tick()
+            time.sleep(self._interval)
+
+    def tick(self) -> bool:
+        # returns True when a new snapshot was written
+        from concurrent.futures import ThreadPoolExecutor
+
+        windows = self._freez.win_man.get_windows()
+        fingerprints = {win["id"]: self._fingerprint(win) for win in windows}
+        # List may not report geometry, so every few ticks all windows are refreshed
+        full = self._ticks % AUTOSAVE_FULL_EVERY == 0
+        self._ticks += 1
+        changed = [
+            win
+            for win in windows
+            if full or fingerprints[win["id"]] != self._fingerprints.get(win["id"])
+        ]
+        with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+            for win, config in zip(changed, executor.map(self._get_config, changed)):
+                if config is None:
+                    fingerprints.pop(win["id"])
+                else:
+                    self._configs[win["id"]] = config
+                    self._pids[win["id"]] = win.get("pid")
+        self._fingerprints = fingerprints
+        self._configs = {
+            win_id: config
+            for win_id, config in self._configs.items()
+            if win_id in fingerprints
+        }
+        # processes of closed windows are forgotten, their pids may be reused
+        self._pids = {win_id: pid for win_id, pid in self._pids.items() if win_id in fingerprints}
+        self._freez._exec_parser.retain(pid for pid in self._pids.values() if pid)
+
+        workspace = {
+            f"win{idx}": self._configs[win["id"]]
+            for idx, win in enumerate(windows)
+            if win["id"] in self._configs
+        }
+        # compared in the form it has on disk, tuples become lists
+        workspace = json.loads(json.dumps(workspace))
+        if workspace == self._last:
+            return False
+        self._freez._store.save(self._name, workspace)
+        self._last = workspace
+        return True
+
+    def _fingerprint(self, win: Dict) -> Tuple:
+        return tuple(
+            win.get(key)
+            for key in ("id", "wm_class", "x", "y", "width", "height", "maximized")
+        )
+
+    def _get_config(self, win: Dict) -> Dict:
+        # the window may close between List and Details
+        try:
+            return self._freez._get_win_config(win)
+        except (ValueError, KeyError):
+            return None
+
+
 class ExecParser:
+    # reads /proc directly and caches every process it has seen
+
+    def __init__(self):
+        self._procs: Dict[int, Dict] = {}
+        # a rule gets (proc, wm_cls, wm_inst) and returns the command or None
+        self._rules: List[Callable] = [
+            self._snap,
+            self._flatpak,
+            self._chrome,
+            self._gnome_terminal,
+        ]
+
+    def add_rule(self, rule: Callable) -> None:
+        # custom rules are tried before the built-in ones
+        self._rules.insert(0, rule)
 
     def get_exec(self, pid: int, wm_cls: str, wm_inst: str) -> str:
-        cmd = ["readlink", "-f", f"/proc/{pid}/exe"]
-        res = subprocess.run(cmd, stdout=subprocess.PIPE)
-        res = res.stdout.decode("utf-8").strip()
-
-        if "snap" in res:
-            return self._snap(res)
-        elif wm_cls == "Google-chrome":
-            return self._chrome(res, wm_inst)
-        elif wm_cls == "org.gnome.Terminal":
-            return self._gnome_terminal()
-        return res
-
-    def _snap(self, res: str) -> str:
+        proc = self.get_proc(pid)
+        for rule in self._rules:
+            res = rule(proc, wm_cls, wm_inst)
+            if res:
+                return res
+        # quoted so the compiled restore plan splits it back into one argument
+        return shlex.quote(proc["exe"]) if proc["exe"] else ""
+
+    def get_cwd(self, pid: int) -> str:
+        # not cached, the process may have changed directory since it was first seen
+        return self._readlink(f"/proc/{pid}/cwd")
+
+    def get_proc(self, pid: int) -> Dict:
+        proc = self._procs.get(pid)
+        if proc is None:
+            proc = {
+                "pid": pid,
+                "exe": self._readlink(f"/proc/{pid}/exe"),
+                "cmdline": self._read_cmdline(pid),
+            }
+            self._procs[pid] = proc
+        return proc
+
+    def clear(self) -> None:
+        self._procs.clear()
+
+    def retain(self, pids: Iterable[int]) -> None:
+        # forgets processes that are gone, their pids may be reused
+        pids = set(pids)
+        for pid in list(self._procs):
+            if pid not in pids:
+                del self._procs[pid]
+
+    def _readlink(self, path: str) -> str:
+        try:
+            return os.readlink(path)
+        except OSError:
+            return ""
+
+    def _read_cmdline(self, pid: int) -> List[str]:
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                cmdline = f.read()
+        except OSError:
+            return []
+        return [arg.decode("utf-8", "replace") for arg in cmdline.split(b"\0") if arg]
+
+    def _snap(self, proc: Dict, wm_cls: str, wm_inst: str) -> str:
         # handles snap apps
-        res = res.split(os.path.sep)
-        return res[-1]
+        if "snap" in proc["exe"]:
+            return proc["exe"].split(os.path.sep)[-1]
+        return None
+
+    def _flatpak(self, proc: Dict, wm_cls: str, wm_inst: str) -> str:
+        # handles flatpak apps, the sandbox describes itself in /.flatpak-info
+        try:
+            with open(f"/proc/{proc['pid']}/root/.flatpak-info", "r") as f:
+                info = f.read()
+        except OSError:
+            return None
+        for line in info.splitlines():
+            if line.startswith("name="):
+                return f"flatpak run {line[len('name='):].strip()}"
+        return None
 
-    def _chrome(self, res: str, wm_inst: str) -> str:
+    def _chrome(self, proc: Dict, wm_cls: str, wm_inst: str) -> str:
+        if wm_cls != "Google-chrome":
+            return None
         if wm_inst == "google-chrome":
             # handles regular chrome windows
             return f"{wm_inst} --new-window"
@@ -200,117 +446,619 @@ class ExecParser:
             # handles chrome installed apps
             app_id = wm_inst.split("_")[-1]
             return f"google-chrome --profile-directory=Default --app-id={app_id}"
-        return res
+        return None
 
-    def _gnome_terminal(self) -> str:
+    def _gnome_terminal(self, proc: Dict, wm_cls: str, wm_inst: str) -> str:
+        if wm_cls != "org.gnome.Terminal":
+            return None
         if NEW_TERM_IN_TAB:
             return "gnome-terminal --tab"
         return "gnome-terminal"
 
-    def _flatpak(self, res: str) -> str:
-        pass
-
 
 class Ufreez(FreezABC):
 
     def __init__(self):
         super().__init__()
-        self._init_term_id = self._get_init_terminal_id()
-
-    def run(self, args: Namespace) -> None:
-        data = self._load_data()
-        if self._list(data, args.list):
+        self.started: float = None
+        self.first_window: float = None
+        # win_id: (position, size, maximized, time placed) of every window put in place
+        self._placed: Dict[int, Tuple] = {}
+        # id(config): its compiled launch entry
+        self._plan: Dict[int, Dict] = {}
+
+    @cached_property
+    def _stats(self) -> LaunchStats:
+        return LaunchStats()
+
+    def _run(self, args: Namespace) -> None:
+        if self._list(args.list):
             return
-        if self._delete(data, args.delete):
+        if self._delete(args.delete):
             return
+        if self._history(args.history):
+            return
+
+        self._drive(self._run_steps(args))
+
+    def _run_steps(self, args: Namespace):
+        # the restore is written once as steps, the sync and async runners only carry them out
+        # the terminal ufreez runs in is found before anything is launched
+        windows = yield ("windows", SNAPSHOT_MAX_AGE)
+        term_id = self._get_init_terminal_id(windows)
+        configs = self._load(args.name) if args.name else []
+        if configs:
+            self.started = time.perf_counter()
+            if args.reconcile or RECONCILE:
+                configs = yield from self._reconcile_steps(configs)
+            for idx, stage in enumerate(self._get_stages(configs)):
+                if idx:
+                    yield ("idle",)
+                if args.parallel or PARALLEL_RESTORE:
+                    yield from self._restore_steps(stage, term_id)
+                else:
+                    for config in stage:
+                        yield from self._restore_steps([config], term_id)
+            if self.first_window is not None:
+                tracer.add("first_window", "metric", self.started, self.first_window)
+            yield from self._settle_steps()
+            self._stats.save()
+        if CLOSE_TERMINAL and term_id:
+            yield ("close", term_id)
+
+    def _drive(self, steps):
+        # each step is a blocking call here, its result or error is sent back into the steps
+        result, error = None, None
+        while True:
+            try:
+                step = steps.throw(error) if error else steps.send(result)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                result, error = getattr(self, f"_step_{step[0]}")(*step[1:]), None
+            except Exception as e:
+                error = e
+
+    def _get_stages(self, configs: List[Dict]) -> List[List[Dict]]:
+        # lower priority restores first, saved order is kept within a stage
+        stages = {}
+        for config in configs:
+            stages.setdefault(config.get("priority", DEFAULT_PRIORITY), []).append(config)
+        return [stages[priority] for priority in sorted(stages)]
+
+    def _wait_idle(self) -> None:
+        # later stages wait until the apps of the earlier ones stopped loading the CPU
+        import psutil
+
+        deadline = time.time() + IDLE_TIMEOUT
+        while time.time() < deadline:
+            if psutil.cpu_percent(interval=0.2) < IDLE_CPU:
+                return
 
-        workspace = data.get(args.name)
-        if workspace:
+    def _load(self, names: List[str]) -> List[Dict]:
+        # the workspaces merged into one plan, windows they have in common are launched once
+        from collections import Counter
+
+        configs, planned = [], Counter()
+        for name in names:
+            name, version = self._store.split_version(name)
+            workspace = self._store.load(name, version)
+            if workspace is None:
+                print(f"No workspace '{name}'")
+                continue
+            plan = self._store.plan(name, workspace, version)
+            counts = Counter()
             for win, config in workspace.items():
-                size = config["size"]
-                position = config["position"]
-                maximized = config["maximized"]
-                executable = config["executable"]
-                extra_cmd = config["extra_cmd"]
-                cwd = config["cwd"]
-                cls = config["wm_class"]
-                self._run_window(
-                    executable, cwd, position, size, maximized, extra_cmd, cls
+                if plan[win]["error"]:
+                    print(f"Skipping {config['wm_class']}: {plan[win]['error']}")
+                    continue
+                self._plan[id(config)] = plan[win]
+                key = (config["wm_class"], config["executable"], config["cwd"])
+                counts[key] += 1
+                # two terminals in one workspace stay two, the same terminal in two workspaces is one
+                if counts[key] > planned[key]:
+                    planned[key] += 1
+                    configs.append(config)
+        return configs
+
+    def _history(self, name: str) -> bool:
+        if name:
+            versions = self._store.versions(name)
+            if versions:
+                for version in versions:
+                    saved = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(version["saved"]))
+                    print(f"{name}@{version['version']}  {saved}  {version['windows']} windows")
+            else:
+                print(f"No history of '{name}'")
+            return True
+        return False
+
+    def _reconcile_steps(self, configs: List[Dict]):
+        # places windows that are already open and returns the configs still missing
+        classes = {config["wm_class"] for config in configs}
+        windows = yield ("windows", SNAPSHOT_MAX_AGE)
+        windows = [win for win in windows if win["wm_class"] in classes]
+        windows.sort(key=lambda win: win["id"])
+        keys = yield ("keys", windows)
+
+        pairs, missing = self._pair(configs, windows, keys)
+        for win_id, config in pairs:
+            with self._trace_context(config):
+                yield self._place_step(win_id, config)
+        yield ("join",)
+        return missing
+
+    def _pair(
+        self, configs: List[Dict], windows: List[Dict], keys: List[Tuple[str, str]]
+    ) -> Tuple[List[Tuple[int, Dict]], List[Dict]]:
+        # saved order picks first, the lowest window id with the same key wins
+        pairs, missing = [], []
+        used = set()
+        for config in configs:
+            key = (config["wm_class"], config["executable"])
+            for win, win_key in zip(windows, keys):
+                if win_key == key and win["id"] not in used:
+                    used.add(win["id"])
+                    pairs.append((win["id"], config))
+                    break
+            else:
+                missing.append(config)
+        return pairs, missing
+
+    def _get_win_key(self, win: Dict) -> Tuple[str, str]:
+        pid = win.get("pid")
+        if pid is None:
+            pid = self.win_man.get_details(win["id"])["pid"]
+        cls = win["wm_class"]
+        return (cls, self._exec_parser.get_exec(pid, cls, win["wm_class_instance"]))
+
+    def _restore_steps(self, configs: List[Dict], term_id: int):
+        # launches the configs as the scheduler admits them and places each window as it shows up
+        yield ("windows", SNAPSHOT_MAX_AGE)
+        since = self.win_man.generation
+        matcher = LaunchMatcher(self.win_man)
+        scheduler = LaunchScheduler()
+        coalescer = LaunchCoalescer(lambda config: self._plan[id(config)]["binary"])
+        # the slowest apps start first, apps without history count as slowest
+        queue = coalescer.plan(sorted(configs, key=self._get_expected, reverse=True))
+        # further windows of an app that is up, they only hand off to it and skip the scheduler
+        followers = []
+        launched, deadlines, procs = {}, {}, {}
+
+        def start(config: Dict, admitted: bool):
+            with self._trace_context(config):
+                try:
+                    with tracer.span("launch", "launch", follower=not admitted):
+                        proc = self._launch(self._plan[id(config)])
+                except OSError as e:
+                    print(f"Could not launch {config['executable']}: {e}")
+                    followers.extend(coalescer.release(config))
+                    return
+                launched[id(config)] = time.perf_counter()
+                deadlines[id(config)] = launched[id(config)] + self._stats.deadline(
+                    config["wm_class"], config["executable"]
                 )
-        if CLOSE_TERMINAL and self._init_term_id:
-            self.win_man.close(self._init_term_id)
-
-    def _run_window(
-        self,
-        executable: str,
-        cwd: str,
-        position: tuple,
-        size: tuple,
-        maximized: bool,
-        extra_cmd: str,
-        cls: str,
-    ) -> None:
-        windows = self.win_man.get_windows()
-        subprocess.Popen(
-            executable.split() + extra_cmd.split(),
+                procs[id(config)] = proc
+                if admitted:
+                    scheduler.add(config, proc.pid)
+                if NEW_TERM_IN_TAB and config["wm_class"] == "org.gnome.Terminal":
+                    yield self._place_step(term_id, config)
+                    followers.extend(coalescer.release(config))
+                else:
+                    matcher.add(config, proc.pid)
+
+        while queue or matcher or followers:
+            while followers:
+                yield from start(followers.pop(0), False)
+            while queue and scheduler.admit():
+                yield from start(queue.pop(0), True)
+
+            # every launch has its own deadline, one that failed right away is not waited for
+            now = time.perf_counter()
+            for config in matcher.pending():
+                crashed = procs[id(config)].poll() not in (None, 0)
+                if now >= deadlines[id(config)] or crashed:
+                    scheduler.settle(config)
+                    followers.extend(coalescer.release(config))
+                    if crashed:
+                        matcher.remove(config)
+                    else:
+                        # no longer waited for, its window is still placed if it shows up in this pass
+                        matcher.expire(config)
+                        self._stats.miss(config["wm_class"], config["executable"])
+                    with self._trace_context(config):
+                        tracer.add(
+                            "wait", "wait", launched[id(config)], now, timeout=True, crashed=crashed
+                        )
+
+            if followers:
+                continue
+            if matcher:
+                timeout = min(deadlines[id(config)] for config in matcher.pending()) - now
+                if queue:
+                    timeout = min(timeout, LAUNCH_TICK)
+                since, new_windows = yield ("wait", since, time.time() + timeout)
+                for win_id, config in matcher.match(new_windows):
+                    scheduler.settle(config)
+                    followers.extend(coalescer.release(config))
+                    end = time.perf_counter()
+                    self._stats.record(
+                        config["wm_class"], config["executable"], end - launched[id(config)]
+                    )
+                    with self._trace_context(config):
+                        late = end >= deadlines[id(config)]
+                        tracer.add("wait", "wait", launched[id(config)], end, late=late)
+                        yield self._place_step(win_id, config)
+            elif queue:
+                yield ("sleep", LAUNCH_TICK)
+        yield ("join",)
+
+    def _get_expected(self, config: Dict) -> float:
+        latency = self._stats.percentile(config["wm_class"], config["executable"], 50)
+        return float("inf") if latency is None else latency
+
+    def _trace_context(self, config: Dict):
+        return tracer.context(wm_class=config["wm_class"], executable=config["executable"])
+
+    def _launch(self, entry: Dict) -> subprocess.Popen:
+        return subprocess.Popen(
+            entry["argv"],
+            executable=entry["binary"],
             start_new_session=True,
-            cwd=cwd,
+            cwd=entry["cwd"],
             **self._devnull,
         )
-        if NEW_TERM_IN_TAB and cls == "org.gnome.Terminal":
-            win_id = self._init_term_id
-        else:
-            win_id = self._get_id(windows)
+
+    def _place_step(self, win_id: int, config: Dict) -> Tuple:
+        return ("place", win_id, config["position"], config["size"], config["maximized"])
+
+    def _place(
+        self, win_id: int, position: tuple, size: tuple, maximized: bool, unmaximize: bool = False
+    ) -> None:
         if win_id:
+            if unmaximize:
+                self.win_man.unmaximize(win_id)
             self.win_man.move_resize(win_id, *position, *size)
             if maximized:
                 self.win_man.maximize(win_id)
+            self._placed[win_id] = (position, size, maximized, time.time())
+            if self.first_window is None:
+                self.first_window = time.perf_counter()
+
+    def _settle_steps(self):
+        # apps that resize themselves after mapping are put back, in sweeps after all launches
+        placed = dict(self._placed)
+        for _ in range(GEOMETRY_PASSES):
+            if not placed:
+                return
+            # GEOMETRY_DELAY after the last placement, windows placed long ago are not waited for
+            wait = max(placement[3] for placement in placed.values()) + GEOMETRY_DELAY - time.time()
+            if wait > 0:
+                yield ("sleep", wait)
+            with tracer.span("settle", "settle", windows=len(placed)) as settle_args:
+                details = yield ("details", list(placed))
+                drifted = [
+                    (win_id, win_details)
+                    for win_id, win_details in zip(placed, details)
+                    if win_details is not None and self._drifted(win_details, placed[win_id])
+                ]
+                settle_args["drifted"] = len(drifted)
+                for win_id, win_details in drifted:
+                    yield self._reapply_step(win_id, win_details, placed[win_id])
+                yield ("join",)
+            placed = {win_id: self._placed[win_id] for win_id, _ in drifted}
+
+    def _get_geometry(self, win_id: int) -> Dict:
+        # the window may be closed by now
+        try:
+            return self.win_man.get_details(win_id)
+        except (ValueError, KeyError):
+            return None
 
-    def _get_id(self, windows: List[Dict]) -> int:
-        start = time.time()
-        win_id = None
-        while not win_id and time.time() - start < TIMEOUT:
-            new_windows = self.win_man.get_windows()
-            if len(new_windows) != len(windows):
-                win_id = self._get_new_id(windows, new_windows)
-            else:
-                time.sleep(0.1)
-        return win_id
-
-    def _get_new_id(self, old: List[Dict], new: List[Dict]) -> int:
-        old_ids = [win["id"] for win in old]
-        new_ids = [win["id"] for win in new]
-        diff = list(set(new_ids) - set(old_ids))
-        if diff:
-            return diff[0]
-        return None
+    def _drifted(self, details: Dict, placement: Tuple) -> bool:
+        position, size, maximized, _ = placement
+        if bool(int(details["maximized"])) != maximized:
+            return True
+        if maximized:
+            return False
+        current = (details["x"], details["y"], details["width"], details["height"])
+        return any(
+            abs(value - wanted) > GEOMETRY_TOLERANCE
+            for value, wanted in zip(current, (*position, *size))
+        )
 
-    def _get_init_terminal_id(self) -> int:
-        windows = self.win_man.get_windows()
+    def _reapply_step(self, win_id: int, details: Dict, placement: Tuple) -> Tuple:
+        position, size, maximized, _ = placement
+        unmaximize = bool(int(details["maximized"])) and not maximized
+        return ("place", win_id, position, size, maximized, unmaximize)
+
+    def _get_init_terminal_id(self, windows: List[Dict]) -> int:
         for win in windows:
             if win["wm_class"] == "org.gnome.Terminal":
                 return win["id"]
         return None
 
+    # the steps carried out with blocking calls, AsyncUfreez awaits them instead
 
-class WinManager:
+    def _step_windows(self, max_age: float) -> List[Dict]:
+        return self.win_man.get_windows(max_age)
 
-    _devnull = {
-        "stdout": subprocess.DEVNULL,
-        "stdin": subprocess.DEVNULL,
-        "stderr": subprocess.DEVNULL,
-    }
+    def _step_keys(self, windows: List[Dict]) -> List[Tuple[str, str]]:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+            return list(executor.map(self._get_win_key, windows))
+
+    def _step_details(self, win_ids: List[int]) -> List[Dict]:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+            return list(executor.map(self._get_geometry, win_ids))
+
+    def _step_wait(self, since: int, deadline: float) -> Tuple[int, List[Dict]]:
+        return self.win_man.wait_for_windows(since, deadline)
+
+    def _step_place(self, *placement) -> None:
+        self._place(*placement)
+
+    def _step_join(self) -> None:
+        pass
+
+    def _step_sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+    def _step_idle(self) -> None:
+        self._wait_idle()
+
+    def _step_close(self, win_id: int) -> None:
+        self.win_man.close(win_id)
+
+
+class LaunchMatcher:
+    # ties each pending launch to the window it opened
+
+    def __init__(self, win_man: "WinManager"):
+        self._win_man = win_man
+        self._pending: List[Tuple[Dict, int]] = []
+        # launches past their deadline, still matched but no longer waited for
+        self._expired: List[Tuple[Dict, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, config: Dict, pid: int) -> None:
+        self._pending.append((config, pid))
+
+    def pending(self) -> List[Dict]:
+        return [config for config, _ in self._pending]
+
+    def remove(self, config: Dict) -> None:
+        self._pending = [launch for launch in self._pending if launch[0] is not config]
+
+    def expire(self, config: Dict) -> None:
+        self._expired += [launch for launch in self._pending if launch[0] is config]
+        self.remove(config)
+
+    def match(self, windows: List[Dict]) -> List[Tuple[int, Dict]]:
+        # best score wins, ties go to the earlier launch and the lower window id
+        launches = self._pending + self._expired
+        candidates = []
+        for win in sorted(windows, key=lambda win: win["id"]):
+            family = self._get_family(win)
+            for idx, (config, pid) in enumerate(launches):
+                score = self._score(win, family, config, pid)
+                if score:
+                    candidates.append((-score, idx, win["id"]))
+
+        matched = []
+        used_wins, used_launches = set(), set()
+        for _, idx, win_id in sorted(candidates):
+            if idx in used_launches or win_id in used_wins:
+                continue
+            used_launches.add(idx)
+            used_wins.add(win_id)
+            matched.append((win_id, launches[idx][0]))
+
+        # expired launches come after the pending ones in launches
+        count = len(self._pending)
+        self._pending = [
+            launch for idx, launch in enumerate(self._pending) if idx not in used_launches
+        ]
+        self._expired = [
+            launch for idx, launch in enumerate(self._expired, count) if idx not in used_launches
+        ]
+        return matched
+
+    def _score(self, win: Dict, family: set, config: Dict, pid: int) -> int:
+        score = 0
+        if pid in family:
+            score += 4
+        if win["wm_class"] == config["wm_class"]:
+            score += 2
+            if win.get("wm_class_instance") == config.get("wm_class_instance"):
+                score += 1
+        return score
+
+    def _get_family(self, win: Dict) -> set:
+        # pids a launch may have: the window's process, its ancestors and its session leader
+        import psutil
+
+        pid = win.get("pid")
+        if pid is None:
+            pid = self._win_man.get_details(win["id"]).get("pid")
+        if not pid:
+            return set()
+        family = {pid}
+        try:
+            family.add(os.getsid(pid))
+            family.update(proc.pid for proc in psutil.Process(pid).parents())
+        except (OSError, psutil.Error):
+            pass
+        return family
+
+
+class LaunchCoalescer:
+    # single-instance apps start cold once, their other windows wait until that one is up
+
+    def __init__(self, get_binary: Callable[[Dict], str]):
+        # windows are grouped by the binary they launch, whatever arguments they pass to it
+        self._get_binary = get_binary
+        self._waiting: Dict[str, List[Dict]] = {}
+
+    def plan(self, configs: List[Dict]) -> List[Dict]:
+        # returns the configs to launch now, the rest are handed out by release
+        queue = []
+        for config in configs:
+            binary = self._get_binary(config)
+            if binary in self._waiting:
+                self._waiting[binary].append(config)
+                continue
+            if self._coalesces(binary):
+                self._waiting[binary] = []
+            queue.append(config)
+        return queue
+
+    def release(self, config: Dict) -> List[Dict]:
+        # the first launch of the binary has its window or gave up, the others can go
+        return self._waiting.pop(self._get_binary(config), [])
+
+    def _coalesces(self, binary: str) -> bool:
+        return os.path.basename(binary) in COALESCE
+
+
+class LaunchScheduler:
+    # admits launches while the machine has headroom, a launch counts until its app settles
 
     def __init__(self):
-        self._builder: CMD_Builder = CMD_Builder()
+        import psutil
+
+        self._psutil = psutil
+        self._running: Dict[int, Tuple[psutil.Process, float]] = {}
+        self._limit = MAX_LAUNCHES
+        self._checked = 0.0
+        # the first reading only sets the reference point
+        psutil.cpu_percent(None)
+        psutil.cpu_times_percent(None)
+
+    def add(self, config: Dict, pid: int) -> None:
+        try:
+            proc = self._psutil.Process(pid)
+            proc.cpu_percent(None)
+        except self._psutil.Error:
+            return
+        self._running[id(config)] = (proc, time.time())
+
+    def settle(self, config: Dict) -> None:
+        self._running.pop(id(config), None)
+
+    def admit(self) -> bool:
+        self._reap()
+        return len(self._running) < self._get_limit()
+
+    def _reap(self) -> None:
+        # an app settled once it exited, went quiet or ran out of time
+        now = time.time()
+        for key, (proc, started) in list(self._running.items()):
+            try:
+                quiet = (
+                    now - started >= SETTLE_MIN_AGE
+                    and proc.cpu_percent(None) < SETTLE_CPU
+                )
+                if quiet or not proc.is_running() or now - started >= TIMEOUT:
+                    del self._running[key]
+            except self._psutil.Error:
+                del self._running[key]
+
+    def _get_limit(self) -> int:
+        # fewer launches at a time the busier the CPU, the disk or the memory is
+        now = time.time()
+        if now - self._checked < LAUNCH_TICK:
+            return self._limit
+        self._checked = now
+        cpu = self._psutil.cpu_percent(None)
+        iowait = getattr(self._psutil.cpu_times_percent(None), "iowait", 0.0)
+        memory = self._psutil.virtual_memory().percent
+        if cpu > 90 or iowait > 20 or memory > 90:
+            self._limit = 1
+        elif cpu > 70 or iowait > 10 or memory > 80:
+            self._limit = max(1, MAX_LAUNCHES // 2)
+        else:
+            self._limit = MAX_LAUNCHES
+        return self._limit
+
 
-    def get_windows(self) -> List[Dict]:
-        cmd = self._builder.build("List")
-        res = subprocess.run(cmd, stdout=subprocess.PIPE)
-        win_list = res.stdout.decode("utf-8")
+class WinManager:
+    # every List refreshes one shared snapshot, a new generation is started whenever windows come or go
+
+    _changes_limit = 256
+
+    def __init__(self, backend=None):
+        self._backend = backend or self._get_backend()
+        self._watcher: WindowWatcher = None
+        self.generation = 0
+        self._snapshot: Dict[int, Dict] = {}
+        self._fetched: float = None
+        self._changes: List[Tuple[int, List[Dict], List[int]]] = []
+        self._snapshot_lock = threading.Lock()
+
+    def _get_backend(self):
+        if BACKEND == "dbus":
+            try:
+                return DBusBackend(DBUS_ADDRESS)
+            except Exception:
+                # no jeepney or no session bus, fall back to the gdbus CLI
+                pass
+        return GdbusBackend()
+
+    def _call(self, method: str, params: List = []) -> str:
+        with tracer.span(method, "bus", win_id=params[0] if params else None):
+            return self._backend.call(method, params)
+
+    def get_windows(self, max_age: float = 0) -> List[Dict]:
+        # a snapshot younger than max_age seconds is returned without asking the shell
+        cached = self._get_cached(max_age)
+        if cached is not None:
+            return cached
+        win_list = self._call("List")
         win_list = self._text_to_iterable(win_list, "[", "]")
+        self._update(win_list)
         return win_list
 
+    def changes(self, since: int) -> Tuple[int, List[Dict], List[int]]:
+        # the current generation, the windows added and the ids removed after generation since
+        with self._snapshot_lock:
+            if self._changes and since < self._changes[0][0] - 1:
+                # older than the kept changes, everything counts as added
+                return self.generation, list(self._snapshot.values()), []
+            added, removed = {}, set()
+            for generation, gen_added, gen_removed in self._changes:
+                if generation <= since:
+                    continue
+                for win in gen_added:
+                    added[win["id"]] = win
+                for win_id in gen_removed:
+                    if added.pop(win_id, None) is None:
+                        removed.add(win_id)
+            return self.generation, list(added.values()), sorted(removed)
+
+    def _get_cached(self, max_age: float) -> List[Dict]:
+        with self._snapshot_lock:
+            if max_age and self._fetched is not None and time.monotonic() - self._fetched < max_age:
+                return list(self._snapshot.values())
+        return None
+
+    def _update(self, windows: List[Dict]) -> None:
+        with self._snapshot_lock:
+            current = {win["id"]: win for win in windows}
+            added = [win for win_id, win in current.items() if win_id not in self._snapshot]
+            removed = [win_id for win_id in self._snapshot if win_id not in current]
+            self._snapshot = current
+            self._fetched = time.monotonic()
+            if added or removed:
+                self.generation += 1
+                self._changes.append((self.generation, added, removed))
+                del self._changes[: -self._changes_limit]
+
     def _text_to_iterable(
         self, text: str, symbol_beg: str, symbol_end: str
     ) -> Iterable:
@@ -320,6 +1068,12 @@ class WinManager:
         text = json.loads(text)
         return text
 
+    def wait_for_windows(self, since: int, deadline: float) -> Tuple[int, List[Dict]]:
+        # returns the generation and the windows added after generation since, [] once deadline passes
+        if self._watcher is None:
+            self._watcher = WindowWatcher(self, self._backend.watch())
+        return self._watcher.wait(since, deadline)
+
     def list(self, pretty: bool = True) -> None:
         if not pretty:
             print(self.get_windows())
@@ -330,9 +1084,7 @@ class WinManager:
                 print()
 
     def get_details(self, win_id: int) -> Dict:
-        cmd = self._builder.build("Details", [win_id])
-        res = subprocess.run(cmd, stdout=subprocess.PIPE)
-        details = res.stdout.decode("utf-8")
+        details = self._call("Details", [win_id])
         details = self._text_to_iterable(details, "{", "}")
         return details
 
@@ -346,25 +1098,54 @@ class WinManager:
             print()
 
     def minimize(self, win_id: int) -> None:
-        cmd = self._builder.build("Minimize", [win_id])
-        subprocess.run(cmd, **self._devnull)
+        self._call("Minimize", [win_id])
 
     def unminimize(self, win_id: int) -> None:
-        cmd = self._builder.build("Unminimize", [win_id])
-        subprocess.run(cmd, **self._devnull)
+        self._call("Unminimize", [win_id])
 
     def maximize(self, win_id: int) -> None:
-        cmd = self._builder.build("Maximize", [win_id])
-        subprocess.run(cmd, **self._devnull)
+        self._call("Maximize", [win_id])
 
     def unmaximize(self, win_id: int) -> None:
-        cmd = self._builder.build("Unmaximize", [win_id])
-        subprocess.run(cmd, **self._devnull)
+        self._call("Unmaximize", [win_id])
 
     def move(self, win_id: int, x: int, y: int) -> None:
-        params = self._get_params([win_id, x, y])
-        cmd = self._builder.build("Move", params)
-        subprocess.run(cmd, **self._devnull)
+        self._call("Move", [win_id, x, y])
+
+    def resize(self, win_id: int, width: int, height: int) -> None:
+        self._call("Resize", [win_id, width, height])
+
+    def move_resize(self, win_id: int, x: int, y: int, width: int, height: int) -> None:
+        self._call("MoveResize", [win_id, x, y, width, height])
+
+    def move_to_workspace(self, win_id: int, workspace_id: int) -> None:
+        self._call("MoveToWorkspace", [win_id, workspace_id])
+
+    def activate(self, win_id: int) -> None:
+        self._call("Activate", [win_id])
+
+    def close(self, win_id: int) -> None:
+        self._call("Close", [win_id])
+
+
+class GdbusBackend:
+    # one gdbus process per call, works without any python D-Bus library
+
+    _devnull = {
+        "stdin": subprocess.DEVNULL,
+        "stderr": subprocess.DEVNULL,
+    }
+
+    def __init__(self):
+        self._builder: CMD_Builder = CMD_Builder()
+
+    def call(self, method: str, params: List = []) -> str:
+        cmd = self._builder.build(method, self._get_params(params))
+        res = subprocess.run(cmd, stdout=subprocess.PIPE, **self._devnull)
+        return res.stdout.decode("utf-8")
+
+    def watch(self):
+        return None
 
     def _get_params(self, params: List) -> List:
         negative = False
@@ -376,26 +1157,138 @@ class WinManager:
             return ["~~"] + params
         return params
 
-    def resize(self, win_id: int, width: int, height: int) -> None:
-        cmd = self._builder.build("Resize", [win_id, width, height])
-        subprocess.run(cmd, **self._devnull)
 
-    def move_resize(self, win_id: int, x: int, y: int, width: int, height: int) -> None:
-        params = self._get_params([win_id, x, y, width, height])
-        cmd = self._builder.build("MoveResize", params)
-        subprocess.run(cmd, **self._devnull)
+class DBusBackend:
+    # keeps one connection to the session bus open and reuses it for every call
+
+    _bus_name = "org.gnome.Shell"
+    _object_path = "/org/gnome/Shell/Extensions/Windows"
+    _interface = "org.gnome.Shell.Extensions.Windows"
+    _signatures = {
+        "List": "",
+        "Details": "u",
+        "GetTitle": "u",
+        "Minimize": "u",
+        "Unminimize": "u",
+        "Maximize": "u",
+        "Unmaximize": "u",
+        "Move": "uii",
+        "Resize": "uuu",
+        "MoveResize": "uiiuu",
+        "MoveToWorkspace": "uu",
+        "Activate": "u",
+        "Close": "u",
+    }
+    _timeout = 5
+
+    def __init__(self, address: str = None, bus_name: str = None):
+        from jeepney import DBusAddress
+        from jeepney.io.threading import DBusRouter, open_dbus_connection
+
+        self._conn = open_dbus_connection(bus=address or "SESSION")
+        self._router = DBusRouter(self._conn)
+        self._address = DBusAddress(
+            self._object_path,
+            bus_name=bus_name or self._bus_name,
+            interface=self._interface,
+        )
 
-    def move_to_workspace(self, win_id: int, workspace_id: int) -> None:
-        cmd = self._builder.build("MoveToWorkspace", [win_id, workspace_id])
-        subprocess.run(cmd, **self._devnull)
+    def call(self, method: str, params: List = []) -> str:
+        msg = self._build_call(method, params)
+        reply = self._router.send_and_get_reply(msg, timeout=self._timeout)
+        return self._unwrap(reply)
 
-    def activate(self, win_id: int) -> None:
-        cmd = self._builder.build("Activate", [win_id])
-        subprocess.run(cmd, **self._devnull)
+    def _build_call(self, method: str, params: List):
+        from jeepney import new_method_call
 
-    def close(self, win_id: int) -> None:
-        cmd = self._builder.build("Close", [win_id])
-        subprocess.run(cmd, **self._devnull)
+        return new_method_call(
+            self._address,
+            method,
+            self._signatures[method],
+            tuple(int(p) for p in params),
+        )
+
+    def _unwrap(self, reply) -> str:
+        from jeepney import MessageType
+
+        # errors are swallowed the same way the gdbus CLI swallows them
+        if reply.header.message_type == MessageType.error or not reply.body:
+            return ""
+        return str(reply.body[0])
+
+    def _get_signal_rule(self):
+        # any signal of the extension interface means the window list may have changed
+        from jeepney import MatchRule
+
+        return MatchRule(type="signal", interface=self._interface)
+
+    def watch(self) -> Queue:
+        from jeepney.bus_messages import message_bus
+
+        rule = self._get_signal_rule()
+        self._router.send_and_get_reply(
+            message_bus.AddMatch(rule), timeout=self._timeout
+        )
+        self._signals = self._router.filter(rule, queue=Queue())
+        return self._signals.queue
+
+    def close(self) -> None:
+        self._router.close()
+        self._conn.close()
+
+
+class WindowWatcher:
+    # wakes up on D-Bus signals if the backend delivers them, otherwise polls with backoff
+    # the backoff carries over between waits, only a signal or a new window resets it
+
+    def __init__(self, win_man: WinManager, signals: Queue = None):
+        self._win_man = win_man
+        self._signals = signals
+        self._interval = POLL_MIN
+        self._next_poll = 0.0
+
+    def wait(self, since: int, deadline: float) -> Tuple[int, List[Dict]]:
+        steps = self._steps(since, deadline)
+        result = None
+        while True:
+            try:
+                step = steps.send(result)
+            except StopIteration as stop:
+                return stop.value
+            result = self._win_man.get_windows() if step is None else self._sleep(step)
+
+    def _steps(self, since: int, deadline: float):
+        # yields None for a List and a timeout for a sleep, which answers whether a signal came
+        while True:
+            generation, new_windows, _ = self._win_man.changes(since)
+            if new_windows:
+                self._reset()
+                return generation, new_windows
+            now = time.time()
+            if now >= self._next_poll:
+                yield None
+                self._next_poll = now + self._interval
+                self._interval = min(self._interval * 2, POLL_MAX)
+            elif now >= deadline:
+                return generation, []
+            elif (yield min(self._next_poll, deadline) - now):
+                self._reset()
+
+    def _reset(self) -> None:
+        self._interval = POLL_MIN
+        self._next_poll = 0.0
+
+    def _sleep(self, timeout: float) -> bool:
+        if self._signals is None:
+            time.sleep(timeout)
+            return False
+        try:
+            self._signals.get(timeout=timeout)
+        except Empty:
+            return False
+        while not self._signals.empty():
+            self._signals.get_nowait()
+        return True
 
 
 class CMD_Builder:
@@ -424,6 +1317,8 @@ class CMD_Builder:
 class CursesManager:
 
     def confirm_menu(self, stdscr, message, selected):
+        import curses
+
         lines, cols = curses.LINES, curses.COLS
         curses.use_default_colors()
         curses.curs_set(0)
@@ -455,56 +1350,106 @@ class CursesManager:
                 selected[0] = option
                 break
 
-    def menu_select(self, stdsrc, items, selected):
-        lines, cols = curses.LINES, curses.COLS
+    def menu_select(self, stdsrc, items, selected, classes=None):
+        import curses
+
         curses.use_default_colors()
         curses.curs_set(0)
-
-        pointer = 0
-        key_hint = "Select with SPACE, confirm with ENTER"
-        max_len = max([len(item) for item in items] + [len(key_hint)]) + 10
-        h = len(items) + 5
-        w = max_len
-        y = lines // 2 - h // 2
-        x = cols // 2 - w // 2
-        win = curses.newwin(h, w, y, x)
-        win.keypad(1)
+        curses.set_escdelay(25)
+
+        classes = classes or [""] * len(items)
+        labels = [f"{item}  ({cls})" if cls else item for item, cls in zip(items, classes)]
+        keys = [f"{item}\0{cls}".lower() for item, cls in zip(items, classes)]
+        key_hint = "SPACE select, ^A all, TAB same class, type to filter, ENTER confirm"
+        query = ""
+        # indices of the items matching query, narrowed from the last result while typing
+        visible = list(range(len(items)))
+        pointer = top = 0
+        win, rows, width = self._menu_win(labels, key_hint)
+        drawn = {}
 
         while True:
-            win.clear()
-            win.addstr(0, 0, key_hint)
-
-            for idx, item in enumerate(items):
-                if idx == pointer:
-                    win.addstr(
-                        idx + 2,
-                        2,
-                        f"{'[x]' if selected[idx] else '[ ]'} {item}",
-                        curses.A_REVERSE,
-                    )
+            if pointer < top:
+                top = pointer
+            elif pointer >= top + rows:
+                top = pointer - rows + 1
+
+            # only rows whose text or highlight changed are written to the screen
+            screen = {0: (key_hint, 0), 1: (f"/{query}  {len(visible)}/{len(items)}", 0)}
+            for row in range(rows):
+                pos = top + row
+                if pos < len(visible):
+                    idx = visible[pos]
+                    text = f"{'[x]' if selected[idx] else '[ ]'} {labels[idx]}"
+                    screen[row + 2] = (text, curses.A_REVERSE if pos == pointer else 0)
                 else:
-                    win.addstr(
-                        idx + 2,
-                        2,
-                        f"{'[x]' if selected[idx] else '[ ]'} {item}",
-                    )
+                    screen[row + 2] = ("", 0)
+            for row, (text, attr) in screen.items():
+                if drawn.get(row) != (text, attr):
+                    win.move(row, 0)
+                    win.clrtoeol()
+                    win.addnstr(row, 2 if row > 1 else 0, text, width - 3, attr)
+                    drawn[row] = (text, attr)
+            win.refresh()
 
             key = win.getch()
 
             if key == curses.KEY_UP:
-                if pointer > 0:
-                    pointer -= 1
-                else:
-                    pointer = len(items) - 1
+                pointer = pointer - 1 if pointer > 0 else max(len(visible) - 1, 0)
             elif key == curses.KEY_DOWN:
-                if pointer < len(items) - 1:
-                    pointer += 1
-                else:
-                    pointer = 0
+                pointer = pointer + 1 if pointer < len(visible) - 1 else 0
+            elif key == curses.KEY_PPAGE:
+                pointer = max(pointer - rows, 0)
+            elif key == curses.KEY_NPAGE:
+                pointer = max(min(pointer + rows, len(visible) - 1), 0)
+            elif key == curses.KEY_HOME:
+                pointer = 0
+            elif key == curses.KEY_END:
+                pointer = max(len(visible) - 1, 0)
             elif key == ord(" "):
-                selected[pointer] = not selected[pointer]
+                if visible:
+                    selected[visible[pointer]] = not selected[visible[pointer]]
+            elif key == 1:  # Ctrl+A toggles all matching items
+                value = not all(selected[idx] for idx in visible)
+                for idx in visible:
+                    selected[idx] = value
+            elif key == 9:  # TAB toggles all matching items of the class under the pointer
+                if visible:
+                    cls = classes[visible[pointer]]
+                    same = [idx for idx in visible if classes[idx] == cls]
+                    value = not all(selected[idx] for idx in same)
+                    for idx in same:
+                        selected[idx] = value
+            elif key in (curses.KEY_BACKSPACE, 127, 8, 27):  # BACKSPACE, ESC clears the filter
+                query = "" if key == 27 else query[:-1]
+                visible = [idx for idx, text in enumerate(keys) if query.lower() in text]
+                pointer = top = 0
+            elif 32 < key < 127:
+                query += chr(key)
+                visible = [idx for idx in visible if query.lower() in keys[idx]]
+                pointer = top = 0
+            elif key == curses.KEY_RESIZE:
+                curses.update_lines_cols()
+                win, rows, width = self._menu_win(labels, key_hint)
+                drawn = {}
             elif key == 10:  # ENTER key
                 break
 
+    def _menu_win(self, labels, key_hint):
+        import curses
+
+        lines, cols = curses.LINES, curses.COLS
+        max_len = max([len(label) for label in labels] + [len(key_hint)]) + 10
+        h = max(min(len(labels) + 5, lines), 4)
+        w = max(min(max_len, cols), 10)
+        y = (lines - h) // 2
+        x = (cols - w) // 2
+        win = curses.newwin(h, w, max(y, 0), max(x, 0))
+        win.keypad(1)
+        # header, filter line and a blank last row
+        return win, h - 3, w
+
     def run(self, func: Callable, *args, **kwargs):
+        import curses
+
         curses.wrapper(func, *args, **kwargs)
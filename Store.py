@@ -0,0 +1,450 @@
+import os
+import json
+import math
+import shlex
+import shutil
+import fcntl
+import tempfile
+import time
+from typing import List, Dict, Tuple
+from contextlib import contextmanager
+from urllib.parse import quote, unquote
+
+from Trace import tracer
+from config import (
+    DATA_DIR,
+    DATA_FILE,
+    HISTORY_LIMIT,
+    TIMEOUT,
+    STATS_SAMPLES,
+    DEADLINE_PERCENTILE,
+    DEADLINE_MARGIN,
+    MIN_DEADLINE,
+    MAX_DEADLINE,
+)
+
+
+class JsonStore:
+    # JSON files under data_dir, written atomically and guarded by one flock
+
+    _lock_file = ".lock"
+
+    def __init__(self, data_dir: str = DATA_DIR):
+        self._data_dir = data_dir
+        self._lock_path = os.path.join(self._data_dir, self._lock_file)
+
+    def _read_json(self, path: str) -> Dict:
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except json.JSONDecodeError as e:
+            print(f"{path} is corrupted and was skipped: {e}")
+            return None
+
+    def _write_json(self, path: str, data: Dict) -> None:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @contextmanager
+    def _lock(self, exclusive: bool):
+        os.makedirs(self._data_dir, exist_ok=True)
+        with open(self._lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class WorkspaceStore(JsonStore):
+    # one file per workspace plus a small manifest, all writes are atomic and locked
+
+    _manifest_file = "manifest.json"
+    _workspace_dir = "workspaces"
+    _history_dir = "history"
+    _plan_dir = "plans"
+
+    def __init__(self, data_dir: str = DATA_DIR):
+        super().__init__(data_dir)
+        self._manifest_path = os.path.join(self._data_dir, self._manifest_file)
+        self._workspace_path = os.path.join(self._data_dir, self._workspace_dir)
+        self._history_path = os.path.join(self._data_dir, self._history_dir)
+        self._plan_path = os.path.join(self._data_dir, self._plan_dir)
+        self._legacy_path = os.path.join(self._data_dir, DATA_FILE)
+
+    def names(self) -> List[str]:
+        with tracer.span("names", "store"):
+            self._migrate()
+            with self._lock(exclusive=False):
+                return list(self._read_manifest())
+
+    def __contains__(self, name: str) -> bool:
+        self._migrate()
+        return os.path.exists(self._get_path(name))
+
+    def load(self, name: str, version: int = None) -> Dict:
+        # the latest version has its own file, older ones are replayed from the history
+        with tracer.span("load", "store", workspace=name, version=version):
+            self._migrate()
+            with self._lock(exclusive=False):
+                if version is None:
+                    return self._read_json(self._get_path(name))
+                history = self._read_json(self._get_history_path(name))
+                if history is None:
+                    return None
+                return self._replay(history, version)
+
+    def save(self, name: str, workspace: Dict) -> None:
+        with tracer.span("save", "store", workspace=name):
+            self._migrate()
+            # compared in the form it has on disk, tuples become lists
+            workspace = json.loads(json.dumps(workspace))
+            with self._lock(exclusive=True):
+                path = self._get_path(name)
+                version = self._add_version(name, self._read_json(path), workspace)
+                self._write_json(path, workspace)
+                self._write_json(self._get_plan_path(name), self._compile(workspace))
+                manifest = self._read_manifest()
+                manifest[name] = self._get_entry(name, workspace, version)
+                self._write_manifest(manifest)
+
+    def plan(self, name: str, workspace: Dict, version: int = None) -> Dict:
+        # launch entries of the workspace windows, only the stale ones are compiled again
+        with tracer.span("plan", "store", workspace=name, version=version):
+            path = self._get_plan_path(name)
+            with self._lock(exclusive=False):
+                plan = self._read_json(path) or {}
+            compiled = {}
+            for key, config in workspace.items():
+                entry = plan.get(key)
+                compiled[key] = entry if self._is_fresh(entry, config) else self._compile_entry(config)
+            # older versions are compiled on the fly, the cached plan belongs to the latest
+            if version is None and compiled != plan:
+                with self._lock(exclusive=True):
+                    self._write_json(path, compiled)
+            return compiled
+
+    def versions(self, name: str) -> List[Dict]:
+        with self._lock(exclusive=False):
+            history = self._read_json(self._get_history_path(name))
+        if history is None:
+            return []
+        base = {
+            "version": history["base"],
+            "saved": history["saved"],
+            "windows": len(history["snapshot"]),
+        }
+        deltas = [
+            {key: delta[key] for key in ("version", "saved", "windows")}
+            for delta in history["deltas"]
+        ]
+        return [base] + deltas
+
+    def prune(self, keep: int, names: List[str] = None) -> None:
+        with self._lock(exclusive=True):
+            for name in names or list(self._read_manifest()):
+                path = self._get_history_path(name)
+                history = self._read_json(path)
+                if history is not None and len(history["deltas"]) >= keep:
+                    self._write_json(path, self._prune(history, keep))
+
+    def split_version(self, name: str) -> Tuple[str, int]:
+        # "name@3" means version 3 of "name", unless a workspace is literally called so
+        base, _, version = name.rpartition("@")
+        if base and version.isdigit() and name not in self:
+            return base, int(version)
+        return name, None
+
+    def delete(self, names: List[str]) -> None:
+        with tracer.span("delete", "store", workspaces=names):
+            self._migrate()
+            with self._lock(exclusive=True):
+                manifest = self._read_manifest()
+                for name in names:
+                    paths = (
+                        self._get_path(name),
+                        self._get_history_path(name),
+                        self._get_plan_path(name),
+                    )
+                    for path in paths:
+                        try:
+                            os.remove(path)
+                        except FileNotFoundError:
+                            pass
+                    manifest.pop(name, None)
+                self._write_manifest(manifest)
+
+    def _get_path(self, name: str) -> str:
+        return os.path.join(self._workspace_path, f"{quote(name, safe='')}.json")
+
+    def _get_history_path(self, name: str) -> str:
+        return os.path.join(self._history_path, f"{quote(name, safe='')}.json")
+
+    def _get_plan_path(self, name: str) -> str:
+        return os.path.join(self._plan_path, f"{quote(name, safe='')}.json")
+
+    def _compile(self, workspace: Dict) -> Dict:
+        return {key: self._compile_entry(config) for key, config in workspace.items()}
+
+    def _compile_entry(self, config: Dict) -> Dict:
+        # argv split like a shell would, the binary resolved on PATH and a cwd that exists
+        entry = {
+            "source": [config["executable"], config["extra_cmd"], config["cwd"]],
+            "argv": None,
+            "binary": None,
+            "mtime": None,
+            "cwd": None,
+            "error": None,
+        }
+        try:
+            argv = shlex.split(config["executable"]) + shlex.split(config["extra_cmd"])
+        except ValueError as e:
+            entry["error"] = f"invalid command: {e}"
+            return entry
+        binary = shutil.which(argv[0]) if argv else None
+        if binary is None:
+            entry["error"] = f"{argv[0] if argv else 'command'} not found"
+            return entry
+        binary = os.path.abspath(binary)
+        cwd = config["cwd"]
+        entry["argv"] = argv
+        entry["binary"] = binary
+        entry["mtime"] = os.stat(binary).st_mtime
+        # a deleted working directory should not keep the app from opening
+        entry["cwd"] = cwd if cwd and os.path.isdir(cwd) else os.path.expanduser("~")
+        return entry
+
+    def _is_fresh(self, entry: Dict, config: Dict) -> bool:
+        # dead entries are always checked again, the binary may have been installed since
+        if not entry or entry["error"]:
+            return False
+        if entry["source"] != [config["executable"], config["extra_cmd"], config["cwd"]]:
+            return False
+        try:
+            mtime = os.stat(entry["binary"]).st_mtime
+        except OSError:
+            return False
+        # entries that fell back to the home directory retry the saved one
+        return mtime == entry["mtime"] and entry["cwd"] == config["cwd"] and os.path.isdir(entry["cwd"])
+
+    def _get_entry(self, name: str, workspace: Dict, version: int = None) -> Dict:
+        return {
+            "file": os.path.basename(self._get_path(name)),
+            "windows": len(workspace),
+            "saved": time.time(),
+            "version": version,
+        }
+
+    def _add_version(self, name: str, previous: Dict, workspace: Dict) -> int:
+        # the history keeps the oldest version in full and only the changed windows after it
+        path = self._get_history_path(name)
+        history = self._read_json(path)
+        now = time.time()
+        if history is None:
+            history = {"base": 1, "saved": now, "snapshot": previous or workspace, "deltas": []}
+            if previous is None:
+                self._write_json(path, history)
+                return 1
+        latest = history["base"] + len(history["deltas"])
+        if previous is None:
+            previous = self._replay(history, latest)
+
+        # window keys are positions, so unchanged windows are found by content and only renamed
+        sources = self._match(previous, workspace)
+        delta = {
+            "version": latest + 1,
+            "saved": now,
+            "windows": len(workspace),
+            "set": {key: win for key, win in workspace.items() if key not in sources},
+            "del": [key for key in previous if key not in sources.values()],
+        }
+        keys = {key: source for key, source in sources.items() if key != source}
+        if keys:
+            delta["keys"] = keys
+        if not delta["set"] and not delta["del"] and not keys:
+            return latest
+        if list(self._apply(previous, delta)) != list(workspace):
+            delta["order"] = list(workspace)
+        history["deltas"].append(delta)
+        if HISTORY_LIMIT and len(history["deltas"]) >= HISTORY_LIMIT:
+            history = self._prune(history, HISTORY_LIMIT)
+        self._write_json(path, history)
+        return latest + 1
+
+    def _match(self, previous: Dict, workspace: Dict) -> Dict:
+        # maps keys of workspace to the keys of equal windows in previous, same key first
+        sources = {key: key for key, win in workspace.items() if previous.get(key) == win}
+        unused = {}
+        for key, win in previous.items():
+            if key not in sources:
+                unused.setdefault(json.dumps(win, sort_keys=True), []).append(key)
+        for key, win in workspace.items():
+            if key not in sources:
+                candidates = unused.get(json.dumps(win, sort_keys=True))
+                if candidates:
+                    sources[key] = candidates.pop(0)
+        return sources
+
+    def _replay(self, history: Dict, version: int) -> Dict:
+        latest = history["base"] + len(history["deltas"])
+        if not history["base"] <= version <= latest:
+            return None
+        workspace = history["snapshot"]
+        for delta in history["deltas"][: version - history["base"]]:
+            workspace = self._apply(workspace, delta)
+        return workspace
+
+    def _apply(self, workspace: Dict, delta: Dict) -> Dict:
+        keys = delta.get("keys", {})
+        renamed = set(keys.values())
+        kept = {key: win for key, win in workspace.items() if key not in delta["del"]}
+        workspace = {key: win for key, win in kept.items() if key not in renamed}
+        workspace.update({key: kept[source] for key, source in keys.items()})
+        workspace.update(delta["set"])
+        if "order" in delta:
+            workspace = {key: workspace[key] for key in delta["order"]}
+        return workspace
+
+    def _prune(self, history: Dict, keep: int) -> Dict:
+        # the oldest kept version becomes the new full snapshot
+        drop = len(history["deltas"]) + 1 - max(keep, 1)
+        if drop <= 0:
+            return history
+        base = history["deltas"][drop - 1]
+        return {
+            "base": base["version"],
+            "saved": base["saved"],
+            "snapshot": self._replay(history, base["version"]),
+            "deltas": history["deltas"][drop:],
+        }
+
+    def _read_manifest(self) -> Dict:
+        manifest = self._read_json(self._manifest_path)
+        if manifest is None:
+            manifest = self._rebuild_manifest()
+        return manifest
+
+    def _rebuild_manifest(self) -> Dict:
+        # the workspace files are the source of truth, the manifest is only an index
+        manifest = {}
+        if not os.path.isdir(self._workspace_path):
+            return manifest
+        for file in sorted(os.listdir(self._workspace_path)):
+            if not file.endswith(".json"):
+                continue
+            workspace = self._read_json(os.path.join(self._workspace_path, file))
+            if workspace is not None:
+                name = self._get_name(file)
+                manifest[name] = self._get_entry(name, workspace)
+        return manifest
+
+    def _get_name(self, file: str) -> str:
+        return unquote(file[: -len(".json")])
+
+    def _write_manifest(self, manifest: Dict) -> None:
+        self._write_json(self._manifest_path, manifest)
+
+    def _migrate(self) -> None:
+        # imports the old monolithic data.json once, it is kept as data.json.bak
+        if not os.path.exists(self._legacy_path):
+            return
+        with self._lock(exclusive=True):
+            if not os.path.exists(self._legacy_path):
+                return
+            data = self._read_json(self._legacy_path)
+            if data is None:
+                return
+            manifest = self._read_manifest()
+            for name, workspace in data.items():
+                self._write_json(self._get_path(name), workspace)
+                manifest[name] = self._get_entry(name, workspace)
+            self._write_manifest(manifest)
+            os.replace(self._legacy_path, f"{self._legacy_path}.bak")
+
+
+class LaunchStats(JsonStore):
+    # seconds from launch to window of every app, the last STATS_SAMPLES per wm_class and executable
+    # and how many restores in a row its window missed the deadline
+
+    _stats_file = "launch_stats.json"
+
+    def __init__(self, data_dir: str = DATA_DIR):
+        super().__init__(data_dir)
+        self._path = os.path.join(self._data_dir, self._stats_file)
+        self._stats: Dict = None
+        # (wm_class, executable, latency), latency is None for a window that did not show up in time
+        self._recorded: List[Tuple[str, str, float]] = []
+
+    def record(self, wm_class: str, executable: str, latency: float) -> None:
+        # kept in memory until save, a restore writes the file once
+        self._add(self._get_entry(wm_class, executable), latency)
+        self._recorded.append((wm_class, executable, latency))
+
+    def miss(self, wm_class: str, executable: str) -> None:
+        # a timeout says nothing about the launch time, it is counted instead of sampled
+        # and a window that shows up later still adds its sample
+        self.record(wm_class, executable, None)
+
+    def save(self) -> None:
+        if not self._recorded:
+            return
+        with self._lock(exclusive=True):
+            # merged into the file as it is now, another restore may have saved meanwhile
+            stats = self._read_json(self._path) or {}
+            for wm_class, executable, latency in self._recorded:
+                self._add(self._get_entry(wm_class, executable, stats), latency)
+            self._write_json(self._path, stats)
+        self._stats = stats
+        self._recorded = []
+
+    def percentile(self, wm_class: str, executable: str, percent: float) -> float:
+        # None until the app was restored at least once
+        samples = sorted(self._get_entry(wm_class, executable)["samples"])
+        if not samples:
+            return None
+        rank = math.ceil(percent / 100 * len(samples)) - 1
+        return samples[min(max(rank, 0), len(samples) - 1)]
+
+    def deadline(self, wm_class: str, executable: str) -> float:
+        # how long to wait for the window, TIMEOUT for apps without history
+        latency = self.percentile(wm_class, executable, DEADLINE_PERCENTILE)
+        if latency is None:
+            return TIMEOUT
+        deadline = min(max(latency * DEADLINE_MARGIN, MIN_DEADLINE), MAX_DEADLINE)
+        # a miss widens the next deadline to at least TIMEOUT, until a window shows up in time
+        if self._get_entry(wm_class, executable)["misses"]:
+            deadline = max(deadline, TIMEOUT)
+        return deadline
+
+    def _add(self, entry: Dict, latency: float) -> None:
+        if latency is None:
+            entry["misses"] += 1
+            return
+        entry["samples"].append(round(latency, 3))
+        del entry["samples"][:-STATS_SAMPLES]
+        entry["misses"] = 0
+
+    def _get_entry(self, wm_class: str, executable: str, stats: Dict = None) -> Dict:
+        if stats is None:
+            if self._stats is None:
+                with self._lock(exclusive=False):
+                    self._stats = self._read_json(self._path) or {}
+            stats = self._stats
+        apps = stats.setdefault(wm_class, {})
+        entry = apps.setdefault(executable, {"samples": [], "misses": 0})
+        # older files keep only the samples
+        if isinstance(entry, list):
+            entry = apps[executable] = {"samples": entry, "misses": 0}
+        return entry
@@ -0,0 +1,102 @@
+import os
+import sys
+import json
+import time
+import threading
+from contextvars import ContextVar
+from typing import List, Dict
+from contextlib import contextmanager, nullcontext
+
+
+class Tracer:
+    # records timed spans, costs a single attribute check while disabled
+
+    def __init__(self):
+        self.enabled = False
+        self._spans: List[Dict] = []
+        self._lock = threading.Lock()
+        self._context: ContextVar = ContextVar("trace_context", default={})
+        self._start = time.perf_counter()
+
+    def enable(self) -> None:
+        self.enabled = True
+        self._spans = []
+        self._start = time.perf_counter()
+
+    def span(self, name: str, cat: str, **args):
+        if not self.enabled:
+            return nullcontext(args)
+        return self._span(name, cat, args)
+
+    @contextmanager
+    def _span(self, name: str, cat: str, args: Dict):
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.add(name, cat, start, time.perf_counter(), **args)
+
+    def add(self, name: str, cat: str, start: float, end: float, **args) -> None:
+        # for spans that do not fit a with block, start and end come from time.perf_counter
+        if not self.enabled:
+            return
+        span = {
+            "name": name,
+            "cat": cat,
+            "ts": (start - self._start) * 1e6,
+            "dur": (end - start) * 1e6,
+            "tid": threading.get_ident(),
+            "args": {**self._context.get(), **args},
+        }
+        with self._lock:
+            self._spans.append(span)
+
+    @contextmanager
+    def context(self, **args):
+        # args attached to every span recorded inside the block, tasks started in it inherit them
+        token = self._context.set({**self._context.get(), **args})
+        try:
+            yield
+        finally:
+            self._context.reset(token)
+
+    def dump(self, path: str) -> None:
+        # .json is written in Chrome trace format, anything else as JSON lines
+        pid = os.getpid()
+        with open(path, "w") as f:
+            if path.endswith(".json"):
+                events = [{**span, "ph": "X", "pid": pid} for span in self._spans]
+                json.dump({"traceEvents": events}, f)
+            else:
+                for span in self._spans:
+                    f.write(json.dumps(span) + "\n")
+
+    def summary(self, limit: int = 10) -> List[Dict]:
+        apps = {}
+        for span in self._spans:
+            cls = span["args"].get("wm_class")
+            if cls is None:
+                continue
+            app = apps.setdefault(
+                cls, {"wm_class": cls, "executable": "", "spans": 0, "total": 0.0, "max": 0.0}
+            )
+            app["executable"] = span["args"].get("executable") or app["executable"]
+            app["spans"] += 1
+            app["total"] += span["dur"] / 1000
+            app["max"] = max(app["max"], span["dur"] / 1000)
+        return sorted(apps.values(), key=lambda app: app["total"], reverse=True)[:limit]
+
+    def print_summary(self, file=sys.stderr) -> None:
+        for span in self._spans:
+            if span["cat"] == "metric":
+                print(f"{span['name']}: {span['dur'] / 1000:.1f} ms", file=file)
+        print(f"{'wm_class':<30} {'spans':>6} {'total ms':>10} {'max ms':>10}  executable", file=file)
+        for app in self.summary():
+            print(
+                f"{app['wm_class'][:30]:<30} {app['spans']:>6} {app['total']:>10.1f} "
+                f"{app['max']:>10.1f}  {app['executable']}",
+                file=file,
+            )
+
+
+tracer = Tracer()
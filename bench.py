@@ -0,0 +1,369 @@
+import os
+import sys
+import json
+import time
+import shlex
+import random
+import shutil
+import tempfile
+import itertools
+import threading
+import subprocess
+from collections import Counter
+from typing import List, Dict
+from argparse import ArgumentParser, Namespace
+
+from Freez import Freez, Ufreez, WinManager, DBusBackend, GdbusBackend
+from Store import WorkspaceStore, LaunchStats
+import freez
+import ufreez
+
+NAME: str = "bench"
+DESCRIPTION: str = (
+    "Runs freez and ufreez end to end against a fake GNOME Shell with N windows "
+    "and reports save/restore latency, time to the first usable window, bus calls and process spawns."
+)
+EPILOG: str = (
+    "Examples:"
+    "  Default sizes (10, 100, 500):          python bench.py || "
+    "  Slow apps with jitter:                 python bench.py -w 50 --launch-delay 0.5 --jitter 0.2 || "
+    "  Through a private dbus-daemon:         python bench.py --dbus || "
+    "  One gdbus process per call:            python bench.py --gdbus -w 10 100 || "
+)
+
+
+class FakeShell:
+    # in-memory stand-in for the Window Calls extension
+
+    def __init__(
+        self,
+        launch_delay: float = 0.05,
+        map_delay: float = 0.01,
+        jitter: float = 0.02,
+        bus_latency: float = 0.0002,
+        seed: int = 0,
+    ):
+        self.launch_delay = launch_delay
+        self.map_delay = map_delay
+        self.jitter = jitter
+        self.bus_latency = bus_latency
+        self.calls: Counter = Counter()
+        self.spawns = 0
+        self._rng = random.Random(seed)
+        self._ids = itertools.count(1000)
+        # pids above pid_max can never belong to a real process
+        self._pids = itertools.count(10_000_000)
+        self._windows: Dict[int, Dict] = {}
+        self._lock = threading.Lock()
+
+    def populate(self, count: int) -> None:
+        for idx in range(count):
+            self._add_window(f"App{idx}", next(self._pids))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._windows.clear()
+            self.calls.clear()
+            self.spawns = 0
+
+    def spawn(self, argv: List[str]) -> int:
+        # the window maps after the app started plus the compositor delay
+        pid = next(self._pids)
+        cls = argv[-1].split("=", 1)[-1]
+        with self._lock:
+            self.spawns += 1
+            delay = self.launch_delay + self.map_delay
+            delay = max(0.0, delay + self._rng.uniform(-self.jitter, self.jitter))
+        timer = threading.Timer(delay, self._add_window, (cls, pid))
+        timer.daemon = True
+        timer.start()
+        return pid
+
+    def call(self, method: str, params: List = []) -> str:
+        if self.bus_latency:
+            time.sleep(self.bus_latency)
+        with self._lock:
+            self.calls[method] += 1
+            if method == "List":
+                return json.dumps(
+                    [
+                        {key: win[key] for key in ("id", "wm_class", "wm_class_instance", "pid", "title")}
+                        for win in self._windows.values()
+                    ]
+                )
+            win = self._windows.get(int(params[0])) if params else None
+            if win is None:
+                return ""
+            if method == "Details":
+                return json.dumps(win)
+            if method == "MoveResize":
+                win["x"], win["y"], win["width"], win["height"] = map(int, params[1:])
+            elif method == "Maximize":
+                win["maximized"] = 1
+            elif method == "Unmaximize":
+                win["maximized"] = 0
+            elif method == "Close":
+                del self._windows[win["id"]]
+            return ""
+
+    def watch(self):
+        return None
+
+    def _add_window(self, cls: str, pid: int) -> None:
+        with self._lock:
+            win_id = next(self._ids)
+            self._windows[win_id] = {
+                "id": win_id,
+                "wm_class": cls,
+                "wm_class_instance": cls.lower(),
+                "pid": pid,
+                "title": f"{cls} window",
+                "x": self._rng.randrange(0, 1920),
+                "y": self._rng.randrange(0, 1080),
+                "width": self._rng.randrange(200, 1920),
+                "height": self._rng.randrange(200, 1080),
+                "maximized": int(self._rng.random() < 0.2),
+            }
+
+
+class FakeShellService:
+    # serves a FakeShell on a private dbus-daemon under the real bus name and path
+
+    # gdbus looks up the argument types before every call
+    _returns_string = ("List", "Details", "GetTitle")
+
+    def __init__(self, shell: FakeShell):
+        self._shell = shell
+        self._daemon = subprocess.Popen(
+            ["dbus-daemon", "--session", "--nofork", "--print-address"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+        self.address = self._daemon.stdout.readline().strip()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _serve(self) -> None:
+        from jeepney import HeaderFields, MessageType, new_method_return
+        from jeepney.bus_messages import message_bus
+        from jeepney.io.blocking import open_dbus_connection
+
+        conn = open_dbus_connection(self.address)
+        conn.send_and_get_reply(message_bus.RequestName(DBusBackend._bus_name))
+        self._ready.set()
+        while True:
+            try:
+                msg = conn.receive()
+            except OSError:
+                # the daemon is gone, the benchmark is over
+                return
+            if msg.header.message_type != MessageType.method_call:
+                continue
+            method = msg.header.fields[HeaderFields.member]
+            if method == "Introspect":
+                conn.send(new_method_return(msg, "s", (self._introspect(),)))
+                continue
+            res = self._shell.call(method, list(msg.body))
+            if method in self._returns_string:
+                conn.send(new_method_return(msg, "s", (res,)))
+            else:
+                conn.send(new_method_return(msg))
+
+    def _introspect(self) -> str:
+        methods = []
+        for method, signature in DBusBackend._signatures.items():
+            args = [f'<arg type="{arg}" direction="in"/>' for arg in signature]
+            if method in self._returns_string:
+                args.append('<arg type="s" direction="out"/>')
+            methods.append(f'<method name="{method}">{"".join(args)}</method>')
+        return (
+            f'<node><interface name="{DBusBackend._interface}">{"".join(methods)}</interface></node>'
+        )
+
+    def close(self) -> None:
+        self._daemon.kill()
+        self._daemon.wait()
+
+
+class BenchUfreez(Ufreez):
+
+    def __init__(self, shell: FakeShell, store: WorkspaceStore, stats: LaunchStats):
+        super().__init__()
+        self._shell = shell
+        self._store = store
+        self._stats = stats
+
+    def _launch(self, entry: Dict):
+        pid = self._shell.spawn(entry["argv"])
+        return Namespace(pid=pid, poll=lambda: None)
+
+
+class CountingPopen(subprocess.Popen):
+    # counts real process spawns, e.g. by the gdbus backend
+
+    count = 0
+
+    def __init__(self, *args, **kwargs):
+        CountingPopen.count += 1
+        super().__init__(*args, **kwargs)
+
+
+def bench(count: int, shell: FakeShell, backend, data_dir: str, parallel: bool) -> Dict:
+    store = WorkspaceStore(data_dir)
+    shell.reset()
+    shell.populate(count)
+    CountingPopen.count = 0
+
+    saver = Freez()
+    saver._store = store
+    saver.win_man = WinManager(backend)
+    # a binary that exists, so the restore plan does not skip the windows
+    app = shlex.quote(sys.executable)
+    saver._exec_parser.add_rule(lambda proc, cls, inst: f"{app} --wm-class={cls}")
+    start = time.perf_counter()
+    saver.run(freez.parser.parse_args(["-n", "bench"]))
+    save_time = time.perf_counter() - start
+    save_calls = sum(shell.calls.values())
+    save_spawns = CountingPopen.count
+
+    # restore onto an empty desktop
+    shell.reset()
+    CountingPopen.count = 0
+    restorer = BenchUfreez(shell, store, LaunchStats(data_dir))
+    restorer.win_man = WinManager(backend)
+    start = time.perf_counter()
+    restorer.run(ufreez.parser.parse_args(["-n", "bench"] + (["-p"] if parallel else [])))
+    restore_time = time.perf_counter() - start
+
+    return {
+        "windows": count,
+        "save_s": save_time,
+        "restore_s": restore_time,
+        "first_s": (restorer.first_window or start) - start,
+        "save_calls": save_calls,
+        "restore_calls": sum(shell.calls.values()),
+        "spawns": save_spawns + CountingPopen.count,
+        "launches": shell.spawns,
+    }
+
+
+def bench_startup(data_dir: str, runs: int = 10) -> float:
+    # best of several `ufreez -l` runs, should stay within the README budget
+    env = dict(os.environ, HOME=data_dir)
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ufreez.py")
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, script, "-l"], env=env, stdout=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def print_results(results: List[Dict]) -> None:
+    header = ["windows", "save_s", "restore_s", "first_s", "save_calls", "restore_calls", "spawns", "launches"]
+    print(" ".join(f"{col:>13}" for col in header))
+    for res in results:
+        print(
+            " ".join(
+                f"{res[col]:>13.3f}" if isinstance(res[col], float) else f"{res[col]:>13}"
+                for col in header
+            )
+        )
+
+
+parser = ArgumentParser(prog=NAME, description=DESCRIPTION, epilog=EPILOG)
+
+parser.add_argument(
+    "-w",
+    "--windows",
+    type=int,
+    nargs="+",
+    default=[10, 100, 500],
+    help="Numbers of simulated windows, one run each",
+)
+
+parser.add_argument(
+    "--launch-delay", type=float, default=0.05, help="Seconds until a launched app starts"
+)
+
+parser.add_argument(
+    "--map-delay", type=float, default=0.01, help="Seconds until a started app's window maps"
+)
+
+parser.add_argument(
+    "--jitter", type=float, default=0.02, help="Random +- seconds added to every launch"
+)
+
+parser.add_argument(
+    "--bus-latency", type=float, default=0.0002, help="Seconds every bus call takes"
+)
+
+parser.add_argument(
+    "-s",
+    "--sequential",
+    action="store_true",
+    help="Restore windows one after another instead of in parallel",
+)
+
+backend_group = parser.add_mutually_exclusive_group()
+
+backend_group.add_argument(
+    "--dbus",
+    action="store_true",
+    help="Serve the fake shell on a private dbus-daemon and use the D-Bus backend",
+)
+
+backend_group.add_argument(
+    "--gdbus",
+    action="store_true",
+    help="Serve the fake shell on a private dbus-daemon and use the gdbus backend, one process per call",
+)
+
+parser.add_argument(
+    "--json", action="store_true", help="Print the results as JSON lines"
+)
+
+
+def main() -> None:
+    args = parser.parse_args()
+    subprocess.Popen = CountingPopen
+    shell = FakeShell(args.launch_delay, args.map_delay, args.jitter, args.bus_latency)
+    service = None
+    backend = shell
+    if args.dbus or args.gdbus:
+        service = FakeShellService(shell)
+    if args.dbus:
+        backend = DBusBackend(service.address)
+    elif args.gdbus:
+        # the gdbus processes find the private daemon as their session bus
+        os.environ["DBUS_SESSION_BUS_ADDRESS"] = service.address
+        backend = GdbusBackend()
+
+    data_dir = tempfile.mkdtemp(prefix="freez-bench-")
+    try:
+        results = [
+            bench(count, shell, backend, data_dir, not args.sequential)
+            for count in args.windows
+        ]
+        startup = bench_startup(data_dir)
+    finally:
+        if args.dbus:
+            backend.close()
+        if service:
+            service.close()
+        shutil.rmtree(data_dir)
+
+    if args.json:
+        for res in results:
+            print(json.dumps(res))
+        print(json.dumps({"startup_s": startup}))
+    else:
+        print_results(results)
+        print(f"\nufreez -l startup: {startup * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 import os
 
 # DATA_DIR = "/home/marek/Programming/projects/freez/data"
-DATA_DIR = f"/home/{os.getlogin()}/.freez/"
+DATA_DIR = os.path.expanduser("~/.freez/")
 DATA_FILE = "data.json"
 # OVERRIDE - do you want to override the saved workspace in case od name collision? False will prompt for confirmation
 OVERWRITE = True  # Default=True
@@ -11,3 +11,61 @@ TIMEOUT = 20  # Default=20
 CLOSE_TERMINAL = False  # Default=False
 # NEW_TERM_IN_TAB - opens new terminal in tab instead of new window
 NEW_TERM_IN_TAB = True  # Default=True
+# BACKEND - "dbus" keeps one session bus connection open (needs jeepney), "gdbus" runs the gdbus CLI for every call
+BACKEND = "dbus"  # Default="dbus"
+# DBUS_ADDRESS - address of the bus with the Window Calls extension, None means the session bus
+DBUS_ADDRESS = None  # Default=None
+# WORKERS - how many windows are queried at the same time when saving a workspace
+WORKERS = 8  # Default=8
+# PARALLEL_RESTORE - launch all windows of a workspace at once instead of one after another (same as ufreez -p)
+PARALLEL_RESTORE = False  # Default=False
+# POLL_MIN, POLL_MAX - bounds in seconds of the backoff used while waiting for a new window
+POLL_MIN = 0.01  # Default=0.01
+POLL_MAX = 0.25  # Default=0.25
+# RECONCILE - reuse already open windows and launch only the missing ones (same as ufreez -R)
+RECONCILE = False  # Default=False
+# DAEMON - send commands to a running freezd instead of doing the work in every freez/ufreez call
+DAEMON = True  # Default=True
+# SOCKET_PATH - where freezd listens
+SOCKET_PATH = os.path.join(os.environ.get("XDG_RUNTIME_DIR", DATA_DIR), "freez.sock")
+# DAEMON_REFRESH - how often in seconds freezd looks for new windows
+DAEMON_REFRESH = 1.0  # Default=1.0
+# AUTOSAVE_INTERVAL - seconds between snapshots of freez -a
+AUTOSAVE_INTERVAL = 60  # Default=60
+# AUTOSAVE_FULL_EVERY - every how many snapshots all windows are queried, not just the changed ones
+AUTOSAVE_FULL_EVERY = 10  # Default=10
+# HISTORY_LIMIT - how many versions of each workspace are kept for ufreez -n name@N, 0 keeps all
+HISTORY_LIMIT = 20  # Default=20
+# PRIORITIES - restore priority saved for windows of a wm_class, lower restores first, e.g. {"Code": 2}
+PRIORITIES = {"org.gnome.Terminal": 0}  # Default={"org.gnome.Terminal": 0}
+# DEFAULT_PRIORITY - priority of windows not listed in PRIORITIES
+DEFAULT_PRIORITY = 1  # Default=1
+# IDLE_CPU, IDLE_TIMEOUT - a later priority stage starts once CPU usage drops below IDLE_CPU percent, or after IDLE_TIMEOUT seconds
+IDLE_CPU = 50  # Default=50
+IDLE_TIMEOUT = 5  # Default=5
+# MAX_LAUNCHES - how many apps may be starting at the same time, halved or cut to 1 when CPU, IO or memory are busy
+MAX_LAUNCHES = os.cpu_count() or 4  # Default=os.cpu_count()
+# LAUNCH_TICK - how often in seconds the launch scheduler re-checks the system load
+LAUNCH_TICK = 0.1  # Default=0.1
+# SETTLE_CPU, SETTLE_MIN_AGE - a started app stops counting as starting once it used less than SETTLE_CPU percent CPU after SETTLE_MIN_AGE seconds
+SETTLE_CPU = 10  # Default=10
+SETTLE_MIN_AGE = 0.5  # Default=0.5
+# CLOSE_WAIT - how many seconds freez -c/-r/-s waits for all closed apps to exit before reporting the ones still running
+CLOSE_WAIT = 10  # Default=10
+# SNAPSHOT_MAX_AGE - how old in seconds a cached window list may be when ufreez looks up windows it does not wait for
+SNAPSHOT_MAX_AGE = 0.1  # Default=0.1
+# STATS_SAMPLES - how many launch-to-window times are kept per app to adapt restore deadlines and order
+STATS_SAMPLES = 20  # Default=20
+# DEADLINE_PERCENTILE, DEADLINE_MARGIN - an app with history gets DEADLINE_MARGIN times this percentile of its launch times to open its window
+DEADLINE_PERCENTILE = 95  # Default=95
+DEADLINE_MARGIN = 1.5  # Default=1.5
+# MIN_DEADLINE, MAX_DEADLINE - bounds in seconds of those deadlines, apps without history get TIMEOUT
+MIN_DEADLINE = 2  # Default=2
+MAX_DEADLINE = 60  # Default=60
+# GEOMETRY_PASSES, GEOMETRY_DELAY - after all launches, up to GEOMETRY_PASSES times: wait GEOMETRY_DELAY seconds after the last placement and put back the windows that moved or resized themselves
+GEOMETRY_PASSES = 3  # Default=3
+GEOMETRY_DELAY = 0.5  # Default=0.5
+# GEOMETRY_TOLERANCE - how many pixels a window may be off before it counts as moved
+GEOMETRY_TOLERANCE = 8  # Default=8
+# COALESCE - single-instance apps: the first of their windows is launched alone, the others right after it is up and without waiting for a launch slot
+COALESCE = ["google-chrome", "chromium", "gnome-terminal", "firefox", "code"]  # Default=["google-chrome", "chromium", "gnome-terminal", "firefox", "code"]
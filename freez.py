@@ -1,6 +1,7 @@
-from Freez import Freez
 from argparse import ArgumentParser, Namespace
 
+from config import DAEMON, OVERWRITE
+
 NAME: str = "freez"
 DESCRIPTION: str = (
     "A command-line tool to manage and restore workspaces by saving and reopening windows. "
@@ -14,9 +15,11 @@ EPILOG: str = (
     "  Save a workspace with window selection:    freez -mn my_workspace || "
     "  List saved workspaces:                     freez -l || "
     "  Delete a workspace:                        freez -d my_workspace || "
+    "  Keep only the last 5 versions:             freez --prune 5 || "
     "  Save workspace and close all windows:      freez -cn my_workspace || "
     "  Shutdown after saving:                     freez -sn my_workspace || "
     "  Reboot after saving:                       freez -rn my_workspace || "
+    "  Autosave every 30 seconds:                 freez -an crash --interval 30 || "
     "For more details, refer to the documentation or use -h for help."
 )
 
@@ -24,6 +27,10 @@ EPILOG: str = (
 def validate_args(args: Namespace):
     if args.manage and not args.name:
         raise ValueError("Name is required to save workspace")
+    if args.autosave and not args.name:
+        raise ValueError("Name is required to autosave workspace")
+    if args.prune is not None and args.prune < 1:
+        raise ValueError("At least one version has to be kept")
 
 
 parser = ArgumentParser(prog=NAME, description=DESCRIPTION, epilog=EPILOG)
@@ -40,6 +47,19 @@ parser.add_argument(
     "-m", "--manage", action="store_true", help="Select which windows to save"
 )
 
+exit_group.add_argument(
+    "-a",
+    "--autosave",
+    action="store_true",
+    help="Keep saving the workspace periodically, only when something changed",
+)
+
+parser.add_argument(
+    "--interval",
+    type=float,
+    help="Seconds between autosaves (default AUTOSAVE_INTERVAL from config.py)",
+)
+
 exit_group.add_argument(
     "-c",
     "--close",
@@ -61,6 +81,13 @@ exit_group.add_argument(
     help="Save the current workspace (if name provided), close all windows and reboot the system",
 )
 
+parser.add_argument(
+    "--trace",
+    type=str,
+    metavar="FILE",
+    help="Write timed spans to FILE (Chrome trace if it ends with .json, JSON lines otherwise)",
+)
+
 mode_group.add_argument(
     "-l",
     "--list",
@@ -68,6 +95,13 @@ mode_group.add_argument(
     help="List all saved workspaces",
 )
 
+mode_group.add_argument(
+    "--prune",
+    type=int,
+    metavar="KEEP",
+    help="Keep only the last KEEP versions of every saved workspace",
+)
+
 mode_group.add_argument(
     "-d",
     "--delete",
@@ -76,12 +110,26 @@ mode_group.add_argument(
     help="Delete a saved workspace",
 )
 
-args = parser.parse_args()
 
-if __name__ == "__main__":
+def main() -> None:
+    args = parser.parse_args()
     try:
         validate_args(args)
+        # curses prompts, traces and the autosave loop need this process, the rest can go to freezd
+        # closing must also run here, freezd would tell the terminal running freez by its own ancestors
+        local = args.manage or args.trace or args.autosave or not OVERWRITE
+        if DAEMON and not (local or args.close or args.reboot or args.shutdown):
+            from Daemon import run_in_daemon
+
+            if run_in_daemon(NAME, args):
+                return
+        from Freez import Freez
+
         freez = Freez()
         freez.run(args)
     except Exception as e:
         print(e)
+
+
+if __name__ == "__main__":
+    main()
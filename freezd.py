@@ -0,0 +1,43 @@
+import sys
+import signal
+from argparse import ArgumentParser
+
+NAME: str = "freezd"
+DESCRIPTION: str = (
+    "An optional background service for freez and ufreez. "
+    "While it runs, freez and ufreez hand their commands to it over a Unix socket, "
+    "so they do not have to reconnect to the bus and rediscover windows on every call."
+    "freezd can be customized in the config.py file."
+)
+EPILOG: str = (
+    "Examples:"
+    "  Start the daemon:                     freezd || "
+    "  Start it on another socket:           freezd --socket /tmp/freez.sock || "
+    "For more details, refer to the documentation or use -h for help. || "
+)
+
+
+parser = ArgumentParser(prog=NAME, description=DESCRIPTION, epilog=EPILOG)
+
+parser.add_argument(
+    "--socket", type=str, help="Path of the Unix socket to listen on"
+)
+
+
+def main() -> None:
+    from Daemon import FreezDaemon
+
+    args = parser.parse_args()
+    daemon = FreezDaemon(args.socket) if args.socket else FreezDaemon()
+    # removes the socket on a plain kill as well
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.server_close()
+
+
+if __name__ == "__main__":
+    main()
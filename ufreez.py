@@ -1,5 +1,6 @@
 from argparse import ArgumentParser
-from Freez import Ufreez
+
+from config import DAEMON
 
 NAME: str = "ufreez"
 DESCRIPTION: str = (
@@ -11,6 +12,11 @@ DESCRIPTION: str = (
 EPILOG: str = (
     "Examples:"
     "  Reopen a saved workspace:             ufreez -n my_workspace || "
+    "  Reopen all windows at once:           ufreez -pn my_workspace || "
+    "  Reopen only missing windows:          ufreez -Rn my_workspace || "
+    "  Reopen an older version:              ufreez -n my_workspace@3 || "
+    "  Reopen two workspaces together:       ufreez -pn base project || "
+    "  List saved versions:                  ufreez -H my_workspace || "
     "  List all saved workspaces:            ufreez -l || "
     "  Delete a saved workspace:             ufreez -d my_workspace || "
     "For more details, refer to the documentation or use -h for help. || "
@@ -22,7 +28,33 @@ parser = ArgumentParser(prog=NAME, description=DESCRIPTION, epilog=EPILOG)
 mode_group = parser.add_mutually_exclusive_group()
 
 mode_group.add_argument(
-    "-n", "--name", type=str, help="Unique name of the saved workspace"
+    "-n",
+    "--name",
+    type=str,
+    nargs="+",
+    help="Unique name of the saved workspace, name@N restores its version N. "
+    "Several workspaces are restored together, windows they share are opened once",
+)
+
+parser.add_argument(
+    "-p",
+    "--parallel",
+    action="store_true",
+    help="Launch all windows at once and place them as they appear",
+)
+
+parser.add_argument(
+    "-R",
+    "--reconcile",
+    action="store_true",
+    help="Reuse windows that are already open and launch only the missing ones",
+)
+
+parser.add_argument(
+    "--trace",
+    type=str,
+    metavar="FILE",
+    help="Write timed spans to FILE (Chrome trace if it ends with .json, JSON lines otherwise)",
 )
 
 mode_group.add_argument(
@@ -32,6 +64,14 @@ mode_group.add_argument(
     help="List all saved workspaces",
 )
 
+mode_group.add_argument(
+    "-H",
+    "--history",
+    type=str,
+    metavar="NAME",
+    help="List the saved versions of a workspace",
+)
+
 mode_group.add_argument(
     "-d",
     "--delete",
@@ -40,11 +80,23 @@ mode_group.add_argument(
     help="Delete a saved workspace",
 )
 
-args = parser.parse_args()
 
-if __name__ == "__main__":
+def main() -> None:
+    args = parser.parse_args()
     try:
+        # traces need this process, everything else can go to freezd
+        if DAEMON and not args.trace:
+            from Daemon import run_in_daemon
+
+            if run_in_daemon(NAME, args):
+                return
+        from Freez import Ufreez
+
         ufreez = Ufreez()
         ufreez.run(args)
     except Exception as e:
         print(e)
+
+
+if __name__ == "__main__":
+    main()